@@ -0,0 +1,264 @@
+"""
+Benchmark both services on synthetic data at several multiples of today's size.
+
+    python benchmarks/bench.py --scales 1 10 100 --requests 200 --output bench.json
+
+Each (service, scale) runs in fresh subprocesses inside a temporary working
+directory that holds the synthetic CSVs, so startup time and peak RSS are
+measured from a cold process. Startup is measured twice: building the model
+from CSV, and loading the artifact written by `python model.py`. Latencies
+come from the artifact run. user-preferences reads preferences from a local
+SQLite file standing in for Postgres. Results are written as JSON.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from synthetic import FLASK_DIR, write_interaction_data, write_preferences_data
+
+SERVICES = ('user-interaction', 'user-preferences')
+TOP_N = 6
+BATCH_SIZE = 20
+MULTI_SEED_BOOKS = 5
+
+PREFERENCE_COLUMNS = ['id', 'preferred_language', 'favorite_genres', 'preferred_book_types', 'preferred_formats']
+
+
+def latency(fn, calls):
+    """Call `fn(*args)` for each args tuple and summarize the wall time."""
+    samples = []
+    for args in calls:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000
+    return {
+        'n': len(samples),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _get_ok(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+# --- Child processes (one service, one scale) ---
+def bench_interaction(requests, rng):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+        import ranking
+        import recommendation as rec
+    result = {'startup_seconds': round(time.perf_counter() - start, 4)}
+    if not requests:
+        return result
+
+    client = app.app.test_client()
+    model = rec.model_slot.get()
+    book_ids = [str(book_id) for book_id in rng.choice(model.item_similarity.book_ids, size=requests)]
+    seed_sets = [book_ids[i:i + MULTI_SEED_BOOKS] for i in range(0, len(book_ids) - MULTI_SEED_BOOKS + 1, MULTI_SEED_BOOKS)]
+
+    def uncached(url):
+        rec.response_cache.clear()
+        _get_ok(client, url)
+
+    result['latency'] = {
+        'rekomendasi_buku_precision_optimal': latency(
+            lambda book_id: ranking.rekomendasi_buku_precision_optimal(
+                book_id, model.neighbour_index, model.book_store, model.popularity_table, top_n=TOP_N, hybrid=True
+            ),
+            [(book_id,) for book_id in book_ids]
+        ),
+        'rekomendasi_buku_multi': latency(
+            lambda seeds: ranking.rekomendasi_buku_multi(
+                seeds, model.neighbour_index, model.book_store, model.popularity_table, top_n=TOP_N, hybrid=True
+            ),
+            [(seeds,) for seeds in seed_sets]
+        ),
+        'GET /recommendation': latency(uncached, [(f'/recommendation?book_id={book_id}',) for book_id in book_ids]),
+        'GET /recommendation (cached)': latency(
+            lambda url: _get_ok(client, url), [(f'/recommendation?book_id={book_ids[0]}',)] * requests
+        ),
+        'GET /recommendation/batch': latency(
+            lambda url: _get_ok(client, url),
+            [(f"/recommendation/batch?book_ids={','.join(seeds)}",) for seeds in seed_sets]
+        ),
+    }
+    return result
+
+
+def load_sqlite(path, csv_path):
+    """Create the `preferences` table in SQLite from the synthetic CSV; arrays stay as '{a,b}' text."""
+    users = pd.read_csv(csv_path, sep=';')[PREFERENCE_COLUMNS]
+    users['updated_at'] = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+    with sqlite3.connect(path) as conn:
+        users.to_sql('preferences', conn, index=False, if_exists='replace')
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS preferences_id ON preferences (id)')
+    return users['id'].astype(str).tolist()
+
+
+def bench_preferences(requests, rng):
+    pref_ids = load_sqlite('preferences.db', 'data/user_preferences.csv')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath('preferences.db')}"
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+        import recommendation as rec
+    result = {'startup_seconds': round(time.perf_counter() - start, 4)}
+    if not requests:
+        return result
+
+    client = app.app.test_client()
+    sample = [str(pref_id) for pref_id in rng.choice(pref_ids, size=requests)]
+    batches = [sample[i:i + BATCH_SIZE] for i in range(0, len(sample) - BATCH_SIZE + 1, BATCH_SIZE)]
+
+    def uncached(fn, *args):
+        rec.result_cache.clear()
+        fn(*args)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), app.app.app_context():
+        result['latency'] = {
+            'get_recommendations_for_user': latency(
+                lambda pref_id: uncached(rec.get_recommendations_for_user, pref_id, TOP_N), [(p,) for p in sample]
+            ),
+            'get_recommendations_for_users': latency(
+                lambda ids: uncached(rec.get_recommendations_for_users, ids, TOP_N), [(ids,) for ids in batches]
+            ),
+            'GET /user-preferences/recommendation': latency(
+                lambda pref_id: uncached(_get_ok, client, f'/user-preferences/recommendation?id={pref_id}&top_n={TOP_N}'),
+                [(p,) for p in sample]
+            ),
+            'GET /user-preferences/recommendation (cached)': latency(
+                lambda url: _get_ok(client, url), [(f'/user-preferences/recommendation?id={sample[0]}&top_n={TOP_N}',)] * requests
+            ),
+            'GET /user-preferences/recommendation/batch': latency(
+                lambda ids: uncached(_get_ok, client, f"/user-preferences/recommendation/batch?ids={','.join(ids)}&top_n={TOP_N}"),
+                [(ids,) for ids in batches]
+            ),
+        }
+    return result
+
+
+def run_child(service, requests, output, seed):
+    sys.path.insert(0, os.path.join(FLASK_DIR, service))
+    rng = np.random.default_rng(seed)
+    bench = bench_interaction if service == 'user-interaction' else bench_preferences
+    result = bench(requests, rng)
+    result['peak_rss_mb'] = peak_rss_mb()
+    with open(output, 'w') as f:
+        json.dump(result, f)
+
+
+# --- Parent process ---
+def _spawn(args, cwd, timeout):
+    completed = subprocess.run(
+        args, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=timeout
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{completed.stderr[-2000:]}")
+
+
+def bench_service(service, scale, requests, seed, timeout):
+    with tempfile.TemporaryDirectory(prefix=f'bench-{service}-{scale}x-') as workdir:
+        write_data = write_interaction_data if service == 'user-interaction' else write_preferences_data
+        start = time.perf_counter()
+        sizes = write_data(workdir, scale, seed=seed)
+        generate_seconds = time.perf_counter() - start
+
+        def child(requests):
+            output = os.path.join(workdir, 'result.json')
+            _spawn(
+                [sys.executable, os.path.abspath(__file__), '--child', service,
+                 '--requests', str(requests), '--seed', str(seed), '--child-output', output],
+                workdir, timeout
+            )
+            with open(output) as f:
+                return json.load(f)
+
+        cold = child(0)
+        start = time.perf_counter()
+        _spawn([sys.executable, os.path.join(FLASK_DIR, service, 'model.py')], workdir, timeout)
+        artifact_build_seconds = time.perf_counter() - start
+        warm = child(requests)
+
+    return {
+        'service': service,
+        'scale': scale,
+        'sizes': sizes,
+        'generate_seconds': round(generate_seconds, 3),
+        'startup_from_csv_seconds': cold['startup_seconds'],
+        'peak_rss_from_csv_mb': cold['peak_rss_mb'],
+        'artifact_build_seconds': round(artifact_build_seconds, 3),
+        'startup_from_artifact_seconds': warm['startup_seconds'],
+        'peak_rss_mb': warm['peak_rss_mb'],
+        'latency': warm.get('latency'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation services on synthetic data")
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100])
+    parser.add_argument('--services', nargs='+', choices=SERVICES, default=list(SERVICES))
+    parser.add_argument('--requests', type=int, default=200, help="Timed calls per function/endpoint")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=int, default=3600, help="Seconds allowed per subprocess")
+    parser.add_argument('--output', help="Write JSON here instead of stdout")
+    parser.add_argument('--child', choices=SERVICES, help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.requests, args.child_output, args.seed)
+        return
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'requests': args.requests,
+        'results': [],
+    }
+    for scale in args.scales:
+        for service in args.services:
+            print(f"[bench] {service} at {scale}x", file=sys.stderr)
+            report['results'].append(bench_service(service, scale, args.requests, args.seed, args.timeout))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
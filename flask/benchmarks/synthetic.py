@@ -0,0 +1,79 @@
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+FLASK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+INTERACTION_DATA = os.path.join(FLASK_DIR, 'user-interaction', 'data')
+PREFERENCES_DATA = os.path.join(FLASK_DIR, 'user-preferences', 'data')
+
+
+def _uuids(rng, n):
+    return [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(n)]
+
+
+def scale_books(books_df, scale, rng, id_col):
+    """
+    Resample the real catalog `scale` times with fresh ids, so every column
+    keeps its real value distribution. Returns (books, source id per book).
+    """
+    picks = rng.integers(0, len(books_df), size=len(books_df) * scale)
+    books = books_df.iloc[picks].reset_index(drop=True)
+    source_ids = books[id_col].astype(str).to_numpy()
+    books[id_col] = _uuids(rng, len(books))
+    books['book_title'] = books['book_title'].astype(str) + ' #' + pd.Series(np.arange(len(books))).astype(str)
+    return books, source_ids
+
+
+def scale_loans(loans_df, books, source_ids, scale, rng):
+    """
+    Resample real loans `scale` times. Each loan goes to a random synthetic
+    copy of the real book and to one of `scale` copies of the real user, so
+    popularity skew and co-borrowing structure are kept at every size.
+    """
+    copies = pd.Series(books['book_id'].to_numpy()).groupby(source_ids).agg(list).to_dict()
+    picks = rng.integers(0, len(loans_df), size=len(loans_df) * scale)
+    loans = loans_df.iloc[picks].reset_index(drop=True)
+
+    all_ids = books['book_id'].to_numpy()
+    book_ids = []
+    for book_id in loans['book_id'].astype(str):
+        candidates = copies.get(book_id)
+        book_ids.append(candidates[rng.integers(len(candidates))] if candidates else all_ids[rng.integers(len(all_ids))])
+    loans['book_id'] = book_ids
+
+    max_user = int(loans_df['user_id'].max()) + 1
+    loans['user_id'] = loans['user_id'].astype(int) + max_user * rng.integers(0, scale, size=len(loans))
+    return loans
+
+
+def scale_preferences(user_df, scale, rng):
+    picks = rng.integers(0, len(user_df), size=len(user_df) * scale)
+    users = user_df.iloc[picks].reset_index(drop=True)
+    users['id'] = np.arange(1, len(users) + 1).astype(str)
+    return users
+
+
+def write_interaction_data(directory, scale, seed=0):
+    """Write data/books_db.csv and data/loans_data.csv for user-interaction at `scale`× size."""
+    rng = np.random.default_rng(seed)
+    books, source_ids = scale_books(pd.read_csv(os.path.join(INTERACTION_DATA, 'books_db.csv')), scale, rng, 'book_id')
+    loans = scale_loans(pd.read_csv(os.path.join(INTERACTION_DATA, 'loans_data.csv')), books, source_ids, scale, rng)
+    data_dir = os.path.join(directory, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    books.to_csv(os.path.join(data_dir, 'books_db.csv'), index=False)
+    loans.to_csv(os.path.join(data_dir, 'loans_data.csv'), index=False)
+    return {'books': len(books), 'loans': len(loans), 'users': int(loans['user_id'].nunique())}
+
+
+def write_preferences_data(directory, scale, seed=0):
+    """Write data/books_dataset.csv and data/user_preferences.csv for user-preferences at `scale`× size."""
+    rng = np.random.default_rng(seed)
+    books, _ = scale_books(pd.read_csv(os.path.join(PREFERENCES_DATA, 'books_dataset.csv'), sep=';'), scale, rng, 'id')
+    users = scale_preferences(pd.read_csv(os.path.join(PREFERENCES_DATA, 'user_preferences.csv'), sep=';'), scale, rng)
+    data_dir = os.path.join(directory, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    books.to_csv(os.path.join(data_dir, 'books_dataset.csv'), sep=';', index=False)
+    users.to_csv(os.path.join(data_dir, 'user_preferences.csv'), sep=';', index=False)
+    return {'books': len(books), 'preferences': len(users)}
@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+
+
+def save_artifact(directory, arrays, metadata=None, keep=3):
+    """
+    Write `arrays` as one .npy file each into a new versioned sub-directory of
+    `directory`, then point `directory/LATEST` at it. Object (string) arrays
+    are stored as fixed-width unicode so they can be memory-mapped; missing
+    values are stored as ''. Only the newest `keep` versions are kept.
+    """
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    target = os.path.join(directory, version)
+    tmp = target + '.tmp'
+    os.makedirs(tmp)
+
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), _storable(values), allow_pickle=False)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'arrays': sorted(arrays),
+        'metadata': metadata or {},
+    }
+    with open(os.path.join(tmp, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Publish the finished directory, then swap the pointer atomically
+    os.rename(tmp, target)
+    latest_tmp = os.path.join(directory, LATEST_FILE + '.tmp')
+    with open(latest_tmp, 'w') as f:
+        f.write(version)
+    os.replace(latest_tmp, os.path.join(directory, LATEST_FILE))
+
+    _prune(directory, keep)
+    return target
+
+
+def load_artifact(directory, mmap_mode='r'):
+    """
+    Load the version named in `directory/LATEST`. Arrays are memory-mapped
+    read-only by default, so forked workers share the same pages.
+    Returns (arrays, manifest), or None if there is no usable artifact.
+    """
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as f:
+            version = f.read().strip()
+        path = os.path.join(directory, version)
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format_version') != FORMAT_VERSION:
+        return None
+
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+        for name in manifest['arrays']
+    }
+    return arrays, manifest
+
+
+def latest_version(directory):
+    """Version named in `directory/LATEST`, or None if nothing has been published."""
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _storable(values):
+    values = np.asarray(values)
+    if values.dtype != object:
+        return values
+    cleaned = np.array(['' if _is_missing(v) else str(v) for v in values.ravel()], dtype=str)
+    return cleaned.reshape(values.shape)
+
+
+def _is_missing(value):
+    return value is None or (np.ndim(value) == 0 and bool(pd.isna(value)))
+
+
+def _prune(directory, keep):
+    # Only published versions count; other sub-directories (e.g. the catalog cache) are left alone
+    versions = sorted(
+        name for name in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, name, MANIFEST_FILE))
+    )
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from common.ids import IdDictionary
+
+
+class BookStore:
+    """
+    Book metadata keyed by book id.
+
+    Rows are stored column-wise as NumPy arrays. Book ids are interned in an
+    IdDictionary whose int32 code is the row number, so a single lookup is a
+    dict access, a batch lookup is one `get_indexer` call plus a `take` per
+    column, and callers that already hold codes skip the id hashing
+    altogether (`row`, `take`).
+    """
+
+    def __init__(self, books_df, key='book_id'):
+        self.key = key
+        books_df = books_df.drop_duplicates(subset=key).reset_index(drop=True)
+        self.df = books_df
+        self.ids = IdDictionary(books_df[key])  # book_id -> row (int32 code)
+        self.columns = {col: books_df[col].to_numpy() for col in books_df.columns}
+
+    @property
+    def positions(self):
+        return self.ids
+
+    def __contains__(self, book_id):
+        return book_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, book_id, columns=None):
+        """Return one book as a dict of plain Python values, or None if unknown."""
+        code = self.ids.get(book_id)
+        if code is None:
+            return None
+        return self.row(code, columns)
+
+    def row(self, code, columns=None):
+        """Like `get`, for a catalog code."""
+        columns = columns or self.columns.keys()
+        return {col: _to_python(self.columns[col][code]) for col in columns}
+
+    def get_many(self, book_ids, columns=None):
+        """
+        Return a DataFrame with one row per requested id, in request order.
+        Unknown ids keep their id and get NaN for every other column, the same
+        as a left merge against the catalog.
+        """
+        book_ids = np.asarray(book_ids, dtype=object)
+        return self.take(self.ids.codes(book_ids), columns, book_ids)
+
+    def take(self, codes, columns=None, book_ids=None):
+        """
+        `get_many` for catalog codes. Codes < 0 (books outside the catalog)
+        get NaN columns; their id comes from `book_ids`, aligned with `codes`,
+        which is required when any code is < 0.
+        """
+        codes = np.asarray(codes, dtype=np.intp)
+        found = codes >= 0
+        columns = columns or list(self.columns.keys())
+
+        data = {}
+        for col in columns:
+            if col == self.key:
+                data[col] = np.asarray(book_ids, dtype=object) if book_ids is not None else self.ids.lookup(codes)
+                continue
+            values = self.columns[col]
+            if found.all():
+                data[col] = values.take(codes)
+            else:
+                column = np.full(len(codes), np.nan, dtype=object)
+                column[found] = values.take(codes[found])
+                data[col] = column
+        return pd.DataFrame(data, columns=columns)
+
+
+def _to_python(value):
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+try:
+    from pyarrow import feather
+except ImportError:  # pyarrow is optional; without it every start parses the CSV
+    feather = None
+
+CACHE_DIR = os.path.join('artifacts', 'catalog')
+CACHE_SUFFIX = '.arrow'
+
+logger = logging.getLogger(__name__)
+_warned_no_pyarrow = False  # The missing-pyarrow warning is logged once per process
+
+
+def read_catalog(path, columns, dtypes=None, categorical=(), cache_dir=CACHE_DIR, **read_csv_kwargs):
+    """
+    Read only `columns` of the CSV at `path`, in a single pass, with explicit
+    dtypes; `categorical` columns become pandas categoricals. Remaining
+    `read_csv` options (sep, encoding, ...) are passed through.
+
+    With pyarrow installed the result is also written as an uncompressed
+    Arrow (Feather v2) file under `cache_dir`, keyed by the CSV's size and
+    mtime plus the read options. Later starts memory-map that file instead of
+    parsing the CSV; converting it to pandas still copies the string columns,
+    but skips tokenizing and type inference. A changed CSV or changed options
+    get a new cache file.
+    """
+    global _warned_no_pyarrow
+    columns = list(columns)
+    dtypes = {**(dtypes or {}), **{col: 'category' for col in categorical}}
+    cache_path = _cache_path(path, columns, dtypes, read_csv_kwargs, cache_dir) if feather else None
+    if feather is None and not _warned_no_pyarrow:
+        logger.warning("pyarrow is not installed; the catalog is parsed from %s on every load", path)
+        _warned_no_pyarrow = True
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            return feather.read_table(cache_path, memory_map=True).to_pandas()
+        except Exception:
+            logger.warning("Unreadable catalog cache %s, re-reading %s", cache_path, path)
+
+    books_df = pd.read_csv(path, usecols=columns, dtype=dtypes, **read_csv_kwargs)[columns]
+    if cache_path:
+        _write_cache(books_df, cache_path)
+    return books_df
+
+
+def _cache_path(path, columns, dtypes, read_csv_kwargs, cache_dir):
+    stat = os.stat(path)
+    key = json.dumps(
+        [os.path.abspath(path), stat.st_size, stat.st_mtime_ns, columns, dtypes, read_csv_kwargs],
+        sort_keys=True, default=str
+    )
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f'{stem}-{hashlib.sha1(key.encode()).hexdigest()[:16]}{CACHE_SUFFIX}')
+
+
+def _write_cache(books_df, cache_path):
+    # A cache that cannot be written only costs the next start a CSV parse
+    cache_dir, name = os.path.split(cache_path)
+    stem = name.rsplit('-', 1)[0]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_path + '.tmp'
+        feather.write_feather(books_df, tmp, compression='uncompressed')
+        os.replace(tmp, cache_path)
+        for other in os.listdir(cache_dir):
+            if other != name and other.rsplit('-', 1)[0] == stem and other.endswith(CACHE_SUFFIX):
+                os.remove(os.path.join(cache_dir, other))
+    except Exception:
+        logger.warning("Could not write catalog cache %s", cache_path, exc_info=True)
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+MISSING = -1  # Code returned for ids that were never interned
+
+
+class IdDictionary:
+    """
+    Interns external string ids (36-character UUIDs) as dense int32 codes,
+    in first-seen order. Ids are translated once at the service boundary;
+    behind it, catalog rows, similarity rows, neighbour lists, rankings and
+    filters are int32 arrays indexed by code. Codes are only ever appended,
+    never reused or reordered, so arrays built against an older state stay
+    valid.
+
+    Works as a read-only mapping id -> code (`in`, `[]`, `get`).
+    """
+
+    def __init__(self, ids=()):
+        self._codes = {}
+        self._values = np.empty(0, dtype=object)
+        self._index = None
+        self._lock = threading.Lock()
+        self.add(ids)
+
+    def __getstate__(self):
+        return {'values': self._values}
+
+    def __setstate__(self, state):
+        self.__init__(state['values'].tolist())
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __contains__(self, id_):
+        return id_ in self._codes
+
+    def __getitem__(self, id_):
+        return self._codes[id_]
+
+    def get(self, id_, default=None):
+        return self._codes.get(id_, default)
+
+    @property
+    def values(self):
+        """Interned ids as an object array; `values[code]` is the id of `code`."""
+        return self._values
+
+    def add(self, ids):
+        """Codes for `ids` as an int32 array, interning the ids not seen before."""
+        ids = list(ids)
+        with self._lock:
+            new = [id_ for id_ in dict.fromkeys(ids) if id_ not in self._codes]
+            if new:
+                start = len(self._values)
+                # Values first: a reader that finds a new code can already look it up
+                self._values = np.concatenate([self._values, np.asarray(new, dtype=object)])
+                self._codes.update(zip(new, range(start, start + len(new))))
+                self._index = None
+            codes = self._codes
+        return np.fromiter((codes[id_] for id_ in ids), dtype=np.int32, count=len(ids))
+
+    def codes(self, ids):
+        """int32 codes for `ids` with one vectorized hash lookup; MISSING for unknown ids."""
+        index = self._index
+        if index is None or len(index) != len(self._values):
+            index = self._index = pd.Index(self._values, dtype=object)
+        return index.get_indexer(np.asarray(ids, dtype=object)).astype(np.int32, copy=False)
+
+    def lookup(self, codes):
+        """Ids for an array of (valid) codes."""
+        return self._values[codes]
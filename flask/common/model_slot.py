@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSlot:
+    """
+    Holds the live model object and swaps in a rebuilt one atomically.
+
+    `loader(current)` returns a model; it receives the live model (None on the
+    first load) and may return it unchanged when there is nothing newer, in
+    which case no swap happens. Request handlers call `get()` once and keep
+    that reference for the whole request, so in-flight requests finish on the
+    old model while new requests see the new one.
+    """
+
+    def __init__(self, loader, on_swap=None):
+        self.loader = loader
+        self.on_swap = on_swap  # called as on_swap(old, new) right after a swap
+        self.loaded_at = None
+        self.swaps = 0
+        self._model = None
+        self._rebuild_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reload()
+
+    def get(self):
+        return self._model
+
+    def swap(self, model):
+        """Publish `model` (a single reference assignment) and return the previous one."""
+        old, self._model = self._model, model
+        self.loaded_at = time.time()
+        if old is not None:
+            self.swaps += 1
+            if self.on_swap is not None:
+                self.on_swap(old, model)
+        return old
+
+    def reload(self):
+        """Load or rebuild in the calling thread and swap if the result is new. Returns True on swap."""
+        with self._rebuild_lock:
+            start = time.perf_counter()
+            model = self.loader(self._model)
+            if model is None or model is self._model:
+                return False
+            old = self.swap(model)
+            logger.info("Model %s in %.2fs", 'loaded' if old is None else 'swapped', time.perf_counter() - start)
+            return True
+
+    def reload_in_background(self):
+        """Start a one-off rebuild thread; returns False if a rebuild is already running."""
+        if self._rebuild_lock.locked():
+            return False
+        threading.Thread(target=self._reload_logged, name='model-reload', daemon=True).start()
+        return True
+
+    def start(self, interval):
+        """Rebuild every `interval` seconds in a daemon thread until `stop()`."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='model-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self._reload_logged()
+
+    def _reload_logged(self):
+        # A failed rebuild keeps serving the current model
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("Model rebuild failed; keeping the current model")
@@ -0,0 +1,79 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram with labels, rendered in the
+    Prometheus text exposition format. Observations only take a lock and
+    bump a few counters, so it is cheap enough for per-request hot paths.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """Observe the wall time of the `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            base = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labelvalues)]
+            for bound, count in zip(self.buckets + (math.inf,), values[:len(self.buckets)] + [values[-2]]):
+                le = '+Inf' if bound == math.inf else repr(float(bound))
+                labels = ','.join(base + [f'le="{le}"'])
+                lines.append(f'{self.name}_bucket{{{labels}}} {count}')
+            suffix = f'{{{",".join(base)}}}' if base else ''
+            lines.append(f'{self.name}_count{suffix} {values[-2]}')
+            lines.append(f'{self.name}_sum{suffix} {values[-1]}')
+        return '\n'.join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All registered metrics in the Prometheus text format (for a /metrics endpoint)."""
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+FORMAT_VERSION = 1
+WRITE_BATCH = 1000  # Rows per executemany while writing
+
+SCHEMA = """
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE topn (key TEXT PRIMARY KEY, stamp TEXT, items BLOB NOT NULL) WITHOUT ROWID;
+"""
+
+
+def write_store(path, rows, version, dtype, metadata=None):
+    """
+    Write a materialized top-N table to the SQLite file `path`. `rows` yields
+    (key, stamp, items): `items` is a 1-D array of `dtype` (the precomputed
+    list, best first) and `stamp` an optional string that has to match at
+    read time, e.g. the source row's updated_at. `version` is the model
+    version the lists were computed with.
+
+    The file is built next to `path` and moved over it in one step, so
+    readers see either the old table or the complete new one.
+    """
+    if version is None:
+        raise ValueError("Materialized tables need a versioned model artifact")
+    dtype = np.dtype(dtype)
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    conn = sqlite3.connect(tmp)
+    count = 0
+    try:
+        conn.executescript('PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;' + SCHEMA)
+        batch = []
+        for key, stamp, items in rows:
+            batch.append((key, stamp, np.ascontiguousarray(items, dtype=dtype).tobytes()))
+            if len(batch) >= WRITE_BATCH:
+                conn.executemany('INSERT OR REPLACE INTO topn VALUES (?, ?, ?)', batch)
+                count += len(batch)
+                batch = []
+        conn.executemany('INSERT OR REPLACE INTO topn VALUES (?, ?, ?)', batch)
+        count += len(batch)
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'version': version,
+            'dtype': np.lib.format.dtype_to_descr(dtype),  # Keeps the fields of structured dtypes
+            'rows': count,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'metadata': metadata or {},
+        }
+        conn.execute("INSERT INTO meta VALUES ('manifest', ?)", (json.dumps(manifest),))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+    return count
+
+
+class TopNStore:
+    """
+    Read side of a table written by `write_store`, bound to one model
+    version. Entries only count when the file was built for that version;
+    otherwise (or with no file) every lookup misses and callers compute
+    live. A file replaced by a newer run is picked up on the next lookup.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self._conn = None
+        self._file_id = None
+        self._manifest = None
+        self._dtype = None
+        self._lock = threading.Lock()
+
+    @property
+    def metadata(self):
+        """Metadata the table was written with, or None if it is not usable for this version."""
+        with self._lock:
+            manifest = self._open()
+        return None if manifest is None else manifest['metadata']
+
+    def get(self, key, stamp=None):
+        """Stored array for `key`, or None if it is missing or its stamp differs from `stamp`."""
+        if self.version is None:
+            return None
+        with self._lock:
+            if self._open() is None:
+                return None
+            row = self._conn.execute('SELECT stamp, items FROM topn WHERE key = ?', (key,)).fetchone()
+            dtype = self._dtype
+        if row is None or (stamp is not None and stamp != row[0]):
+            return None
+        return np.frombuffer(row[1], dtype=dtype)
+
+    def get_many(self, keys, stamps=None):
+        """
+        {key: array} for the `keys` found. With `stamps` ({key: stamp}), an
+        entry only counts if its stored stamp equals the given one; keys
+        without a stamp there are not checked.
+        """
+        keys = list(keys)
+        if not keys or self.version is None:
+            return {}
+        with self._lock:
+            manifest = self._open()
+            if manifest is None:
+                return {}
+            rows = []
+            for start in range(0, len(keys), 500):  # Below SQLite's bound-parameter limit
+                chunk = keys[start:start + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT key, stamp, items FROM topn WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ))
+            dtype = self._dtype
+        stamps = stamps or {}
+        return {
+            key: np.frombuffer(items, dtype=dtype)
+            for key, stamp, items in rows
+            if stamps.get(key) is None or stamps[key] == stamp
+        }
+
+    def delete(self, key):
+        """Drop `key` so it is recomputed live; returns True if it was stored."""
+        if self.version is None:
+            return False
+        with self._lock:
+            if self._open() is None:
+                return False
+            deleted = self._conn.execute('DELETE FROM topn WHERE key = ?', (key,)).rowcount
+            self._conn.commit()
+            # Our own write is not a replaced file; keep the connection
+            stat = os.stat(self.path)
+            self._file_id = (stat.st_ino, stat.st_mtime_ns)
+        return deleted > 0
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _open(self):
+        # (Re)connect when the file appeared or was replaced since the last lookup
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._close()
+            return None
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return self._manifest
+
+        self._close()
+        self._file_id = file_id
+        conn = manifest = None
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            row = conn.execute("SELECT value FROM meta WHERE name = 'manifest'").fetchone()
+            manifest = json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError):
+            pass
+        if manifest is None or manifest.get('format_version') != FORMAT_VERSION or manifest.get('version') != self.version:
+            if conn is not None:
+                conn.close()
+            return None
+        self._conn, self._manifest = conn, manifest
+        self._dtype = np.lib.format.descr_to_dtype(manifest['dtype'])
+        return manifest
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = self._manifest = self._file_id = None
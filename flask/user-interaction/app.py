@@ -1,39 +1,122 @@
-from flask import Flask, request, jsonify
+import logging
+import os
+
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from recommendation import rekomendasi_buku_precision_optimal, book_df, peminjaman_df, similarity_df_filtered
+
+# Log per request ada di level DEBUG; jalankan dengan LOG_LEVEL=DEBUG untuk melihatnya
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='[%(levelname)s] %(name)s: %(message)s')
+
+from ranking import rekomendasi_buku_precision_optimal, rekomendasi_buku_multi
+from recommendation import tambah_peminjaman, model_slot, response_cache
+from common.prometheus import CONTENT_TYPE, REGISTRY
 
 app = Flask(__name__)
 CORS(app)
 
+MAX_BUKU_SUMBER = 50
+MODEL_REFRESH_INTERVAL = float(os.getenv('MODEL_REFRESH_INTERVAL', 0))  # Detik antar rebuild model; 0 = nonaktif
+
+if MODEL_REFRESH_INTERVAL > 0:
+    model_slot.start(MODEL_REFRESH_INTERVAL)
+
+def _baca_top_n(nilai):
+    # top_n harus bilangan bulat >= 1 ("abc", 2.5, 0 dan -3 ditolak); None jika tidak valid
+    try:
+        top_n = int(str(nilai).strip())
+    except ValueError:
+        return None
+    return top_n if top_n >= 1 else None
+
 @app.route('/recommendation', methods=['GET'])
 def rekomendasi_api():
     buku_id = request.args.get('book_id')
-    top_n = int(request.args.get('top_n', 6))  # default 5 jika tidak ada
+    top_n = _baca_top_n(request.args.get('top_n', 6))  # default 6 jika tidak ada
     if not buku_id:
         return jsonify({'error': 'Parameter book_id wajib disertakan'}), 400
+    if top_n is None:
+        return jsonify({'error': 'Parameter top_n wajib bilangan bulat >= 1'}), 400
 
     try:
+        model = model_slot.get()  # Satu versi model untuk seluruh request
         rekomendasi = rekomendasi_buku_precision_optimal(
             buku_id=buku_id,
-            similarity_df_filtered=similarity_df_filtered,
-            book_df=book_df,
-            peminjaman_df=peminjaman_df,
+            neighbour_index=model.neighbour_index,
+            book_store=model.book_store,
+            popularity_table=model.popularity_table,
             top_n=top_n,
             hybrid=True,
-            verbose=False
+            verbose=False,
+            cache=response_cache,
+            materialized=model.tabel_rekomendasi
         )
         # Ambil info buku asal
-        buku_asal = book_df[book_df['book_id'] == buku_id]
-        if buku_asal.empty:
+        buku_asal = model.book_store.get(buku_id, columns=['book_title', 'genre'])
+        if buku_asal is None:
             return jsonify({'error': 'Buku asal tidak ditemukan'}), 404
 
-        book_title = buku_asal.iloc[0]['book_title']
-        genre = buku_asal.iloc[0]['genre']
+        book_title = buku_asal['book_title']
+        genre = buku_asal['genre']
         hasil = rekomendasi.to_dict(orient='records')
         return jsonify({'buku_id': buku_id, 'book_title': book_title, 'genre': genre, 'rekomendasi': hasil})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/recommendation/batch', methods=['GET', 'POST'])
+def rekomendasi_batch_api():
+    data = request.get_json(silent=True) or {}
+    buku_ids = data.get('book_ids')
+    if buku_ids is None:
+        buku_ids = [buku_id for buku_id in request.args.get('book_ids', '').split(',') if buku_id]
+    if not isinstance(buku_ids, list) or not buku_ids:
+        return jsonify({'error': 'Parameter book_ids wajib berupa list book_id yang tidak kosong'}), 400
+    if len(buku_ids) > MAX_BUKU_SUMBER:
+        return jsonify({'error': f'Maksimal {MAX_BUKU_SUMBER} book_ids per permintaan'}), 400
+    top_n = _baca_top_n(data.get('top_n', request.args.get('top_n', 6)))
+    if top_n is None:
+        return jsonify({'error': 'Parameter top_n wajib bilangan bulat >= 1'}), 400
+
+    try:
+        model = model_slot.get()
+        rekomendasi = rekomendasi_buku_multi(
+            buku_ids,
+            neighbour_index=model.neighbour_index,
+            book_store=model.book_store,
+            popularity_table=model.popularity_table,
+            top_n=top_n,
+            hybrid=True
+        )
+        return jsonify({'buku_ids': buku_ids, 'rekomendasi': rekomendasi.to_dict(orient='records')})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/loans', methods=['POST'])
+def tambah_peminjaman_api():
+    data = request.get_json(silent=True) or {}
+    loans = data.get('loans')
+    if not isinstance(loans, list) or not all(
+        isinstance(loan, dict) and loan.get('user_id') is not None and loan.get('book_id') for loan in loans
+    ):
+        return jsonify({'error': 'Parameter loans wajib berupa list {user_id, book_id}'}), 400
+
+    try:
+        hasil = tambah_peminjaman([(loan['user_id'], loan['book_id']) for loan in loans])
+        return jsonify(hasil)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/model/reload', methods=['POST'])
+def reload_model_api():
+    # Rebuild di background; request lain tetap dilayani model lama sampai swap
+    dimulai = model_slot.reload_in_background()
+    return jsonify({'reload': 'dimulai' if dimulai else 'sedang berjalan'}), 202
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True)
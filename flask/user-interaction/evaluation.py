@@ -0,0 +1,197 @@
+"""
+Evaluasi offline (time split) untuk rekomendasi item-item.
+
+Model dilatih hanya dari peminjaman sebelum `cutoff`. Untuk setiap user yang
+sudah punya riwayat sebelum cutoff, rekomendasi dari buku yang terakhir
+dipinjamnya dibandingkan dengan buku baru yang benar-benar dipinjam setelah
+cutoff (hit-rate, precision@k, recall@k). Skoring dijalankan paralel per
+user dengan process pool, dan throughput dilaporkan bersama kualitasnya:
+
+    python evaluation.py --cutoff 2024-03-01 --k 5 10 --top-k 20 50 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from model import muat_katalog
+from popularity import PopularityTable
+from ranking import rekomendasi_buku_multi, rekomendasi_buku_precision_optimal
+from similarity import NeighbourIndex, SparseItemSimilarity, SCORE_THRESHOLD, TOP_K_NEIGHBOURS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.book_store import BookStore
+
+LOAN_FILES = ['data/loans_data.csv']
+CUTOFF_QUANTILE = 0.8  # Default cutoff: 80% peminjaman pertama untuk training
+USERS_PER_TASK = 16  # Jumlah user per task yang dikirim ke worker
+
+_state = {}  # Model hasil training di tiap worker, diisi oleh _init_worker
+
+
+# --- Data ---
+def muat_peminjaman(paths=LOAN_FILES):
+    peminjaman_df = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    peminjaman_df['borrow_date'] = pd.to_datetime(peminjaman_df['borrow_date'])
+    return peminjaman_df
+
+
+def split_waktu(peminjaman_df, cutoff=None):
+    """Bagi peminjaman menjadi (latih, uji, cutoff) berdasarkan borrow_date."""
+    if cutoff is None:
+        cutoff = peminjaman_df['borrow_date'].quantile(CUTOFF_QUANTILE).normalize()
+    cutoff = pd.Timestamp(cutoff)
+    latih = peminjaman_df[peminjaman_df['borrow_date'] < cutoff]
+    uji = peminjaman_df[peminjaman_df['borrow_date'] >= cutoff]
+    return latih, uji, cutoff
+
+
+def kasus_uji(latih, uji, jumlah_seed=1):
+    """
+    Daftar (user_id, buku seed, buku target) untuk setiap user yang punya
+    riwayat sebelum cutoff. Seed = buku terakhir yang dipinjam (terbaru dulu);
+    target = buku yang dipinjam setelah cutoff dan belum pernah dipinjam.
+    """
+    riwayat = (
+        latih.sort_values('borrow_date', ascending=False, kind='stable')
+        .groupby('user_id')['book_id']
+        .agg(lambda book_ids: list(dict.fromkeys(book_ids)))
+    )
+    kasus = []
+    for user_id, buku_uji in uji.groupby('user_id')['book_id']:
+        seed = riwayat.get(user_id)
+        if not seed:
+            continue
+        target = set(buku_uji) - set(seed)
+        if target:
+            kasus.append((user_id, seed[:jumlah_seed], target))
+    return kasus
+
+
+# --- Worker ---
+def _init_worker(book_df, item_similarity, usage_filter):
+    book_store = BookStore(book_df, key='book_id')
+    _state.update(
+        book_store=book_store,
+        neighbour_index=NeighbourIndex(item_similarity, book_df, usage_filters=(usage_filter,), catalog_ids=book_store.ids),
+        popularity_table=PopularityTable(book_store, item_similarity.loan_counts(), item_similarity.book_ids, usage_filters=(usage_filter,)),
+        usage_filter=usage_filter,
+    )
+
+
+def _skor_kasus(batch, top_n, score_threshold):
+    """Rekomendasikan untuk sekumpulan kasus; kembalikan (jumlah hit, jumlah target, latensi) per kasus."""
+    hasil = []
+    for user_id, seed, target in batch:
+        mulai = time.perf_counter()
+        if len(seed) == 1:
+            rekomendasi = rekomendasi_buku_precision_optimal(
+                seed[0], _state['neighbour_index'], _state['book_store'], _state['popularity_table'],
+                top_n=top_n, usage_filter=_state['usage_filter'], score_threshold=score_threshold
+            )
+        else:
+            rekomendasi = rekomendasi_buku_multi(
+                seed, _state['neighbour_index'], _state['book_store'], _state['popularity_table'],
+                top_n=top_n, usage_filter=_state['usage_filter'], score_threshold=score_threshold
+            )
+        latensi = time.perf_counter() - mulai
+        hits = len(set(rekomendasi['book_id']) & target)
+        hasil.append((hits, len(target), latensi))
+    return hasil
+
+
+# --- Evaluasi ---
+def evaluasi_time_split(
+    peminjaman_df,
+    book_df,
+    cutoff=None,
+    k_values=(5, 10),
+    top_k=TOP_K_NEIGHBOURS,
+    score_threshold=SCORE_THRESHOLD,
+    jumlah_seed=1,
+    usage_filter="For Rent",
+    workers=None
+):
+    """
+    Latih model dari peminjaman sebelum cutoff lalu ukur hit-rate,
+    precision@k dan recall@k pada peminjaman setelahnya. Mengembalikan satu
+    dict per k berisi metrik kualitas dan throughput.
+    """
+    latih, uji, cutoff = split_waktu(peminjaman_df, cutoff)
+
+    mulai = time.perf_counter()
+    item_similarity = SparseItemSimilarity.from_loans(latih, top_k=top_k, score_threshold=score_threshold)
+    waktu_build = time.perf_counter() - mulai
+
+    kasus = kasus_uji(latih, uji, jumlah_seed)
+    batches = [kasus[i:i + USERS_PER_TASK] for i in range(0, len(kasus), USERS_PER_TASK)]
+    laporan = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(book_df, item_similarity, usage_filter)
+    ) as pool:
+        for k in k_values:
+            mulai = time.perf_counter()
+            futures = [pool.submit(_skor_kasus, batch, k, score_threshold) for batch in batches]
+            hasil = np.array([row for future in futures for row in future.result()], dtype=float).reshape(-1, 3)
+            durasi = time.perf_counter() - mulai
+
+            hits, jumlah_target, latensi = hasil[:, 0], hasil[:, 1], hasil[:, 2]
+            laporan.append({
+                'cutoff': cutoff.date().isoformat(),
+                'k': k,
+                'top_k_neighbours': top_k,
+                'score_threshold': score_threshold,
+                'seed_books': jumlah_seed,
+                'train_loans': len(latih),
+                'test_loans': len(uji),
+                'users': len(kasus),
+                'hit_rate': float((hits > 0).mean()) if len(kasus) else 0.0,
+                'precision_at_k': float((hits / k).mean()) if len(kasus) else 0.0,
+                'recall_at_k': float((hits / jumlah_target).mean()) if len(kasus) else 0.0,
+                'build_seconds': round(waktu_build, 4),
+                'users_per_second': round(len(kasus) / durasi, 1) if durasi > 0 else None,
+                'latency_ms_p50': round(float(np.percentile(latensi, 50)) * 1000, 3) if len(kasus) else None,
+                'latency_ms_p99': round(float(np.percentile(latensi, 99)) * 1000, 3) if len(kasus) else None,
+            })
+    return laporan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluasi time split rekomendasi item-item")
+    parser.add_argument('--loans', nargs='+', default=LOAN_FILES, help="CSV peminjaman (user_id, book_id, borrow_date)")
+    parser.add_argument('--books', default='data/books_db.csv')
+    parser.add_argument('--cutoff', default=None, help="Tanggal cutoff (YYYY-MM-DD); default kuantil 80%% borrow_date")
+    parser.add_argument('--k', nargs='+', type=int, default=[5, 10])
+    parser.add_argument('--top-k', nargs='+', type=int, default=[TOP_K_NEIGHBOURS], help="Nilai TOP_K_NEIGHBOURS yang dibandingkan")
+    parser.add_argument('--threshold', type=float, default=SCORE_THRESHOLD)
+    parser.add_argument('--seeds', type=int, default=1, help="Jumlah buku terakhir user yang dipakai sebagai seed")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help="Cetak hasil sebagai JSON")
+    args = parser.parse_args()
+
+    peminjaman_df = muat_peminjaman(args.loans)
+    book_df = muat_katalog(args.books)
+    laporan = []
+    for top_k in args.top_k:
+        laporan.extend(evaluasi_time_split(
+            peminjaman_df, book_df, cutoff=args.cutoff, k_values=args.k, top_k=top_k,
+            score_threshold=args.threshold, jumlah_seed=args.seeds, workers=args.workers
+        ))
+
+    if args.json:
+        print(json.dumps(laporan, indent=2))
+        return
+    for row in laporan:
+        print(
+            f"top_k={row['top_k_neighbours']:>4} k={row['k']:>3} users={row['users']:>4} | "
+            f"hit-rate={row['hit_rate']:.4f} precision@k={row['precision_at_k']:.4f} recall@k={row['recall_at_k']:.4f} | "
+            f"{row['users_per_second']} users/s, p50={row['latency_ms_p50']} ms, p99={row['latency_ms_p99']} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
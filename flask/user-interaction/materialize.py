@@ -0,0 +1,126 @@
+"""
+Job offline: hitung rekomendasi ("buku serupa") setiap buku di similarity
+matrix untuk artifact model saat ini, dibagi per shard ke process pool, lalu
+tulis ke artifacts/rekomendasi.sqlite. Yang disimpan per buku adalah daftar
+akhir: tetangga teratas yang sudah lolos filter usage dan threshold, plus
+cadangan fallback popularitas dari genrenya, sebagai kode katalog dan skor.
+Endpoint /recommendation tinggal mengambil metadatanya; hitung langsung hanya
+untuk buku yang tidak ada di tabel, top_n yang lebih besar, atau yang
+berubah karena peminjaman baru (POST /loans):
+
+    python model.py            # tabel terikat ke satu versi artifact
+    python materialize.py --top-n 20 --workers 4
+
+Jalankan ulang setiap ada artifact baru; tabel untuk versi lain diabaikan.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='[%(levelname)s] %(name)s: %(message)s')
+
+from ranking import HYBRID_CANDIDATES, KANDIDAT_DTYPE, fallback_rekomendasi
+from recommendation import model_slot
+from similarity import DEFAULT_USAGE_FILTER, SCORE_THRESHOLD
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.topn_store import write_store
+
+TOP_N_TERSIMPAN = 20  # top_n terbesar yang dilayani dari tabel
+BUKU_PER_TASK = 2048  # Jumlah baris similarity per shard yang dikirim ke worker
+
+logger = logging.getLogger(__name__)
+
+_state = {}  # Model di tiap worker, diisi oleh _init_worker
+
+
+# --- Worker ---
+def _init_worker(versi):
+    # Worker hasil fork memakai model milik parent; selain itu memuat artifact yang sama saat import
+    model = model_slot.get()
+    if model.versi != versi:
+        raise RuntimeError(f"Worker memuat model {model.versi}, seharusnya {versi}")
+    _state['model'] = model
+
+
+def _hitung_shard(awal, akhir, top_n, usage_filter, score_threshold):
+    """Rekomendasi untuk baris similarity [awal, akhir), sebagai (book_id, None, baris KANDIDAT_DTYPE)."""
+    model = _state['model']
+    neighbour_index, book_store = model.neighbour_index, model.book_store
+    jumlah_tetangga = max(top_n, HYBRID_CANDIDATES)
+    jumlah_cadangan = max(top_n // 2, HYBRID_CANDIDATES)
+    hasil = []
+    for book_id in neighbour_index.book_ids[awal:akhir]:
+        posisi, skor = neighbour_index.neighbour_positions(book_id, usage_filter)
+        lolos = min(jumlah_tetangga, np.searchsorted(-skor, -score_threshold, side='right'))
+        posisi, skor = posisi[:lolos], skor[:lolos]
+
+        # Cadangan fallback (urutan popularitas) untuk buku yang tetangganya bisa
+        # kurang dari top_n, termasuk pada mode hybrid; mode hybrid men-sample darinya
+        kode_cadangan = np.empty(0, dtype=np.int32)
+        if min(HYBRID_CANDIDATES, lolos) < top_n:
+            buku = book_store.get(book_id, columns=['genre'])
+            fallback_df = fallback_rekomendasi(
+                model.popularity_table, buku['genre'] if buku else "Tidak diketahui", book_id,
+                jumlah_cadangan, usage_filter, False, exclude_ids=set(neighbour_index.book_ids[posisi])
+            )
+            kode_cadangan = book_store.ids.codes(fallback_df['book_id'])
+
+        baris = np.zeros(lolos + len(kode_cadangan), dtype=KANDIDAT_DTYPE)
+        baris['posisi'][:lolos], baris['posisi'][lolos:] = posisi, -1
+        baris['kode'][:lolos], baris['kode'][lolos:] = neighbour_index.catalog_codes(posisi), kode_cadangan
+        baris['skor'][:lolos] = skor
+        hasil.append((book_id, None, baris))
+    return hasil
+
+
+# --- Materialisasi ---
+def materialisasi(
+    top_n=TOP_N_TERSIMPAN,
+    usage_filter=DEFAULT_USAGE_FILTER,
+    score_threshold=SCORE_THRESHOLD,
+    workers=None
+):
+    """Tulis tabel rekomendasi untuk artifact model saat ini; kembalikan jumlah buku yang disimpan."""
+    model = model_slot.get()
+    if model.versi is None:
+        raise SystemExit("Belum ada artifact model; jalankan `python model.py` dulu.")
+
+    jumlah_buku = len(model.neighbour_index.book_ids)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model.versi,)) as pool:
+        futures = [
+            pool.submit(_hitung_shard, awal, min(awal + BUKU_PER_TASK, jumlah_buku), top_n, usage_filter, score_threshold)
+            for awal in range(0, jumlah_buku, BUKU_PER_TASK)
+        ]
+        baris = (row for future in futures for row in future.result())
+        return write_store(
+            model.tabel_rekomendasi.path, baris, model.versi, KANDIDAT_DTYPE,
+            metadata={
+                'model': 'user-interaction',
+                'top_n': top_n,
+                'usage_filter': usage_filter,
+                'score_threshold': score_threshold,
+            }
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hitung rekomendasi setiap buku ke tabel rekomendasi")
+    parser.add_argument('--top-n', type=int, default=TOP_N_TERSIMPAN, help="top_n terbesar yang dilayani dari tabel")
+    parser.add_argument('--usage-filter', default=DEFAULT_USAGE_FILTER)
+    parser.add_argument('--threshold', type=float, default=SCORE_THRESHOLD)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    mulai = time.perf_counter()
+    jumlah = materialisasi(args.top_n, args.usage_filter, args.threshold, args.workers)
+    logger.info("Tabel rekomendasi untuk %d buku ditulis dalam %.2fs", jumlah, time.perf_counter() - mulai)
+
+
+if __name__ == '__main__':
+    main()
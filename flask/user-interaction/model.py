@@ -0,0 +1,172 @@
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from popularity import PopularityTable
+from similarity import NeighbourIndex, SparseItemSimilarity
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.artifact import latest_version, load_artifact, save_artifact
+from common.book_store import BookStore
+from common.catalog import read_catalog
+from common.topn_store import TopNStore
+
+ARTIFACT_DIR = "artifacts"
+MODEL_SCHEMA = 1
+TABEL_REKOMENDASI_FILE = "rekomendasi.sqlite"  # Ditulis oleh materialize.py, di samping versi artifact
+BOOKS_CSV = "data/books_db.csv"
+LOANS_CSV = "data/loans_data.csv"
+BOOK_COLUMNS = ['book_id', 'book_title', 'genre', 'author', 'usage']
+BOOK_DTYPES = {'book_id': 'str', 'book_title': 'str', 'author': 'str'}
+BOOK_CATEGORICAL = ['genre', 'usage']
+
+logger = logging.getLogger(__name__)
+
+
+# --- Bangun Model dari CSV ---
+def muat_katalog(path=BOOKS_CSV):
+    """
+    Baca katalog sekali, hanya kolom BOOK_COLUMNS (tanpa deskripsi, cover,
+    dll.) dengan dtype eksplisit; genre dan usage sebagai categorical.
+    Di-cache sebagai Arrow jika pyarrow terpasang (lihat common.catalog).
+    """
+    return read_catalog(path, BOOK_COLUMNS, dtypes=BOOK_DTYPES, categorical=BOOK_CATEGORICAL)
+
+
+def bangun_model():
+    book_df = muat_katalog()
+    peminjaman_df = pd.read_csv(LOANS_CSV)
+    item_similarity = SparseItemSimilarity.from_loans(peminjaman_df)
+    return book_df, item_similarity
+
+
+def tanda_sumber(paths=(BOOKS_CSV, LOANS_CSV)):
+    """(path, mtime_ns, ukuran) file CSV sumber; berubah setiap kali salah satunya ditulis ulang."""
+    tanda = []
+    for path in paths:
+        stat = os.stat(path)
+        tanda.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(tanda)
+
+
+# --- Simpan / Muat Artifact ---
+def simpan_model(book_df, item_similarity, directory=ARTIFACT_DIR):
+    matrix = item_similarity.matrix
+    item_user = item_similarity.item_user.tocsr()
+    arrays = {
+        'similarity_indptr': matrix.indptr,
+        'similarity_indices': matrix.indices,
+        'similarity_data': matrix.data,
+        'similarity_book_ids': item_similarity.book_ids,
+        'item_user_indptr': item_user.indptr,
+        'item_user_indices': item_user.indices,
+        'item_user_data': item_user.data,
+        'item_user_user_ids': item_similarity.user_ids,
+    }
+    for col in BOOK_COLUMNS:
+        arrays[f'book_{col}'] = book_df[col].to_numpy(dtype=object)
+
+    metadata = {
+        'model': 'user-interaction',
+        'schema': MODEL_SCHEMA,
+        'top_k': item_similarity.top_k,
+        'score_threshold': item_similarity.score_threshold,
+        'books': len(book_df),
+        'books_in_matrix': len(item_similarity),
+    }
+    return save_artifact(directory, arrays, metadata)
+
+
+def muat_model(directory=ARTIFACT_DIR):
+    """Muat (book_df, item_similarity) dari artifact terbaru, atau None jika belum ada."""
+    loaded = load_artifact(directory)
+    if loaded is None:
+        return None
+    arrays, manifest = loaded
+    metadata = manifest['metadata']
+    if metadata.get('model') != 'user-interaction' or metadata.get('schema') != MODEL_SCHEMA:
+        return None
+
+    # String kosong di artifact berarti nilai kosong (NaN) di CSV
+    book_df = pd.DataFrame({
+        col: pd.Series(arrays[f'book_{col}'], dtype=object).replace('', np.nan) for col in BOOK_COLUMNS
+    })
+
+    n_books = len(arrays['similarity_book_ids'])
+    matrix = sparse.csr_matrix(
+        (arrays['similarity_data'], arrays['similarity_indices'], arrays['similarity_indptr']),
+        shape=(n_books, n_books), copy=False
+    )
+    item_user = sparse.csr_matrix(
+        (arrays['item_user_data'], arrays['item_user_indices'], arrays['item_user_indptr']),
+        shape=(n_books, len(arrays['item_user_user_ids'])), copy=False
+    )
+    item_similarity = SparseItemSimilarity(
+        matrix, arrays['similarity_book_ids'],
+        item_user=item_user, user_ids=arrays['item_user_user_ids'],
+        top_k=metadata['top_k'], score_threshold=metadata['score_threshold']
+    )
+    return book_df, item_similarity
+
+
+# --- Model Utuh (satu versi yang bisa di-swap) ---
+class RecommenderModel:
+    """
+    Satu versi model lengkap: katalog, similarity matrix, indeks tetangga dan
+    ranking popularitas. Versi baru dibangun utuh di luar jalur request lalu
+    di-swap lewat `common.model_slot.ModelSlot`; request memegang referensi ke
+    satu versi dari awal sampai akhir.
+    """
+
+    def __init__(self, book_df, item_similarity, versi=None, directory=ARTIFACT_DIR, sumber=None):
+        self.versi = versi  # Versi artifact, atau None jika dibangun dari CSV
+        self.sumber = sumber  # tanda_sumber() CSV yang dipakai jika dibangun dari CSV
+        self.book_df = book_df
+        self.item_similarity = item_similarity
+        self.book_store = BookStore(book_df, key='book_id')
+        self.neighbour_index = NeighbourIndex(item_similarity, book_df, catalog_ids=self.book_store.ids)
+        self.popularity_table = PopularityTable(self.book_store, item_similarity.loan_counts(), item_similarity.book_ids)
+        self.update_lock = threading.Lock()  # Untuk update inkremental (tambah_peminjaman)
+        # Rekomendasi per buku hasil materialize.py untuk versi artifact ini (kosong jika dibangun dari CSV)
+        self.tabel_rekomendasi = TopNStore(os.path.join(directory, TABEL_REKOMENDASI_FILE), versi)
+
+    @classmethod
+    def bangun(cls):
+        sumber = tanda_sumber()  # Sebelum dibaca: file yang berubah selama build memicu build berikutnya
+        return cls(*bangun_model(), sumber=sumber)
+
+    @classmethod
+    def muat(cls, directory=ARTIFACT_DIR):
+        versi = latest_version(directory)
+        model = muat_model(directory)
+        return None if model is None else cls(*model, versi=versi, directory=directory)
+
+    @classmethod
+    def muat_atau_bangun(cls, sekarang=None, directory=ARTIFACT_DIR):
+        """
+        Loader untuk ModelSlot: kembalikan `sekarang` apa adanya jika artifact
+        terbaru sudah terpasang, muat artifact baru jika ada, atau bangun
+        ulang dari CSV jika belum ada artifact. Tanpa artifact, model yang
+        dibangun dari CSV dipertahankan selama file CSV-nya tidak berubah,
+        sehingga refresh berkala tidak membuang peminjaman dari POST /loans.
+        """
+        versi = latest_version(directory)
+        if sekarang is not None and versi is not None and sekarang.versi == versi:
+            return sekarang
+        model = cls.muat(directory)
+        if model is None:
+            if sekarang is not None and sekarang.versi is None and sekarang.sumber == tanda_sumber():
+                return sekarang
+            logger.info("Artifact model tidak ditemukan di '%s'. Membangun model dari CSV.", directory)
+            model = cls.bangun()
+        return model
+
+
+if __name__ == '__main__':
+    # Build offline: python model.py
+    path = simpan_model(*bangun_model())
+    print(f"Artifact model disimpan di {path}")
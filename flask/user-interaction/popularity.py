@@ -0,0 +1,120 @@
+import random
+
+import numpy as np
+
+from similarity import DEFAULT_USAGE_FILTER
+
+FALLBACK_COLUMNS = ['book_id', 'book_title', 'genre', 'author', 'score']
+
+
+class PopularityTable:
+    """
+    Ranking popularitas (jumlah peminjaman) buku per genre untuk fallback.
+    Hanya buku yang ada di similarity matrix yang masuk ranking. Buku disimpan
+    sebagai kode katalog int32 (baris BookStore), jadi ranking, jumlah
+    peminjaman dan pengecualian semuanya berupa operasi integer. Ranking per
+    filter usage dibangun sekali lalu diperbarui lewat `record_loans`.
+    """
+
+    def __init__(self, book_store, loan_counts, candidate_ids, usage_filters=(DEFAULT_USAGE_FILTER,)):
+        self.book_store = book_store
+        self.ids = book_store.ids
+
+        # Jumlah peminjaman per kode katalog; buku di luar katalog tidak pernah masuk ranking
+        self.counts = np.zeros(len(self.ids), dtype=np.int64)
+        codes = self.ids.codes(list(loan_counts))
+        jumlah = np.fromiter(loan_counts.values(), dtype=np.int64, count=len(loan_counts))
+        self.counts[codes[codes >= 0]] = jumlah[codes >= 0]
+
+        self._members = {}
+        self._genre_of = {}
+        self.changed_genres = set()  # Genre yang ranking-nya diperbarui sejak tabel dibangun
+        self.add_candidates(candidate_ids, rebuild=False)
+
+        self._usage_masks = {}
+        self._rankings = {}
+        for usage_filter in usage_filters:
+            self._rankings[usage_filter] = self._build(usage_filter)
+
+    def add_candidates(self, book_ids, rebuild=True):
+        """Masukkan buku baru (mis. yang baru muncul di similarity matrix) ke ranking."""
+        genres = set()
+        genre_column = self.book_store.columns['genre']
+        for code in self.ids.codes(book_ids).tolist():
+            if code < 0 or code in self._genre_of:
+                continue
+            genre = genre_column[code]
+            if not isinstance(genre, str):
+                continue
+            self._genre_of[code] = genre
+            self._members.setdefault(genre, []).append(code)
+            genres.add(genre)
+        if rebuild:
+            self._refresh(genres)
+
+    def record_loans(self, book_ids):
+        """Tambahkan peminjaman baru dan urutkan ulang hanya genre yang terdampak."""
+        codes = self.ids.codes(book_ids)
+        codes = codes[codes >= 0]
+        np.add.at(self.counts, codes, 1)
+        self._refresh({self._genre_of[code] for code in codes.tolist() if code in self._genre_of})
+
+    def top(self, genre, jumlah, usage_filter=DEFAULT_USAGE_FILTER, exclude_ids=(), hybrid=False):
+        """Ambil `jumlah` buku teratas (atau sampel acak jika hybrid) dari genre tersebut."""
+        ranking = self._ranking(usage_filter).get(genre, ())
+        if jumlah <= 0 or not len(ranking):
+            return self.book_store.take([], columns=FALLBACK_COLUMNS[:-1]).assign(score=0.0)
+
+        if hybrid:
+            # Sample sedikit lebih banyak lalu buang yang dikecualikan,
+            # tanpa perlu menyalin seluruh pool genre
+            banyak = min(len(ranking), jumlah + len(exclude_ids))
+            kandidat = (ranking[i] for i in random.sample(range(len(ranking)), banyak))
+        else:
+            kandidat = iter(ranking)
+
+        # book_id yang dikecualikan diterjemahkan sekali ke kode katalog
+        dikecualikan = {self.ids.get(book_id) for book_id in exclude_ids}
+        terpilih = []
+        for code in kandidat:
+            if code in dikecualikan:
+                continue
+            terpilih.append(code)
+            if len(terpilih) == jumlah:
+                break
+
+        hasil = self.book_store.take(terpilih, columns=FALLBACK_COLUMNS[:-1])
+        hasil['score'] = 0.0  # Skor default fallback
+        return hasil
+
+    def _ranking(self, usage_filter):
+        ranking = self._rankings.get(usage_filter)
+        if ranking is None:
+            ranking = self._rankings[usage_filter] = self._build(usage_filter)
+        return ranking
+
+    def _usage_mask(self, usage_filter):
+        mask = self._usage_masks.get(usage_filter)
+        if mask is None:
+            usage = self.book_store.columns['usage']
+            mask = self._usage_masks[usage_filter] = np.fromiter(
+                (isinstance(u, str) and usage_filter in u for u in usage), dtype=bool, count=len(usage)
+            )
+        return mask
+
+    def _build(self, usage_filter, genres=None):
+        rankings = {}
+        for genre in (self._members if genres is None else genres):
+            members = np.asarray(self._members.get(genre, []), dtype=np.int32)
+            if usage_filter:
+                members = members[self._usage_mask(usage_filter)[members]]
+            # Terbanyak dipinjam dulu; urutan katalog (kode) sebagai tie-breaker
+            rankings[genre] = members[np.lexsort((members, -self.counts[members]))]
+        return rankings
+
+    def _refresh(self, genres):
+        if not genres:
+            return
+        self.changed_genres.update(genres)
+        for usage_filter, rankings in self._rankings.items():
+            rankings.update(self._build(usage_filter, genres))
@@ -0,0 +1,336 @@
+"""
+Fungsi rekomendasi murni: kandidat tetangga, metadata, dan fallback
+popularitas untuk satu versi model (neighbour_index, book_store,
+popularity_table) yang diberikan pemanggil. Modul ini tidak memuat model
+saat diimpor, sehingga aman dipakai evaluation.py dan worker process pool;
+model yang dilayani API ada di recommendation.py.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from similarity import SCORE_THRESHOLD
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.prometheus import REGISTRY
+
+HYBRID_CANDIDATES = 15  # Jumlah kandidat teratas yang di-sample pada mode hybrid
+# Satu baris tabel rekomendasi (materialize.py): posisi similarity (-1 untuk
+# fallback), kode katalog (-1 untuk buku di luar katalog) dan skor
+KANDIDAT_DTYPE = np.dtype([('posisi', np.int32), ('kode', np.int32), ('skor', np.float32)])
+
+# Durasi per tahap (materialized, neighbours, top_n, enrich, fallback), ditampilkan di /metrics
+waktu_tahap = REGISTRY.histogram(
+    'recommendation_stage_seconds', 'Time spent in each recommendation stage.', labelnames=('stage',)
+)
+
+
+# --- Fungsi Utama Rekomendasi ---
+def rekomendasi_buku_precision_optimal(
+    buku_id,
+    neighbour_index,
+    book_store,
+    popularity_table,
+    top_n=5,
+    hybrid=False,
+    verbose=False,
+    usage_filter="For Rent",
+    score_threshold=SCORE_THRESHOLD,  # Default threshold ketat
+    cache=None,
+    materialized=None
+):
+    # Cache (opsional) menyimpan kandidat yang sudah lengkap: tetangga teratas
+    # beserta metadatanya plus cadangan fallback (lihat `_bangun_kandidat`).
+    # Request yang kena cache hanya memilih baris dari sana (acak jika hybrid),
+    # tanpa mengambil metadata atau ranking popularitas lagi. Model dan
+    # versinya ikut di kunci agar entri lama tidak terpakai setelah update
+    # inkremental atau swap model.
+    # `materialized` (opsional) adalah tabel rekomendasi model ini (model.tabel_rekomendasi);
+    # kandidat diambil dari sana jika ada dan masih berlaku, selain itu dihitung langsung.
+    kunci = (
+        buku_id, top_n, usage_filter, hybrid, score_threshold,
+        neighbour_index.item_similarity, neighbour_index.item_similarity.version
+    )
+    kandidat = cache.get(kunci) if cache is not None else None
+    if kandidat is None:
+        kandidat = _bangun_kandidat(
+            buku_id, neighbour_index, book_store, popularity_table, top_n, hybrid,
+            usage_filter, score_threshold, verbose, materialized
+        )
+        if cache is not None:
+            cache.set(kunci, kandidat)
+
+    with waktu_tahap.time('top_n'):
+        return _pilih_kandidat(kandidat, top_n, hybrid)
+
+
+def _bangun_kandidat(
+    buku_id, neighbour_index, book_store, popularity_table, top_n, hybrid,
+    usage_filter, score_threshold, verbose, materialized
+):
+    """
+    Kandidat rekomendasi satu buku sebagai (kandidat_df, jumlah_tetangga,
+    jumlah_fallback). `jumlah_tetangga` baris pertama kandidat_df adalah
+    tetangga teratas (terurut, sudah dengan metadata); sisanya cadangan
+    fallback popularitas dari genre buku, `jumlah_fallback` di antaranya
+    masuk ke hasil. Mode hybrid menyimpan cadangan lebih banyak agar fallback
+    ikut bervariasi.
+    """
+    if materialized is not None:
+        with waktu_tahap.time('materialized'):
+            kandidat = _kandidat_tersimpan(
+                buku_id, materialized, neighbour_index, book_store, popularity_table, top_n, hybrid,
+                usage_filter, score_threshold
+            )
+        if kandidat is not None:
+            return kandidat
+
+    with waktu_tahap.time('neighbours'):
+        kategori_buku, neighbour_posisi, neighbour_scores = _kandidat_tetangga(
+            buku_id, neighbour_index, book_store, usage_filter, score_threshold,
+            max(top_n, HYBRID_CANDIDATES), verbose
+        )
+    ada_di_matriks = neighbour_posisi is not None
+
+    # Gabungkan dengan metadata buku
+    with waktu_tahap.time('enrich'):
+        if not ada_di_matriks:
+            neighbour_posisi, neighbour_scores = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        tetangga_df = _ambil_metadata(neighbour_index, book_store, neighbour_posisi)
+        tetangga_df['score'] = neighbour_scores.astype(float)
+
+    # Buku yang tidak ada di similarity matrix sepenuhnya memakai fallback
+    bisa_terpilih = _bisa_terpilih(len(tetangga_df), hybrid)
+    jumlah_fallback = _jumlah_fallback(bisa_terpilih, top_n) if ada_di_matriks else top_n
+    if jumlah_fallback <= 0:
+        return tetangga_df, len(tetangga_df), 0
+
+    with waktu_tahap.time('fallback'):
+        fallback_df = fallback_rekomendasi(
+            popularity_table, kategori_buku, buku_id,
+            max(jumlah_fallback, HYBRID_CANDIDATES) if hybrid else jumlah_fallback, usage_filter, hybrid,
+            exclude_ids=set(tetangga_df['book_id'][:bisa_terpilih])
+        )
+        kandidat_df = pd.concat([tetangga_df, fallback_df[tetangga_df.columns]], ignore_index=True)
+    return kandidat_df, len(tetangga_df), min(jumlah_fallback, len(fallback_df))
+
+
+def _bisa_terpilih(jumlah_tetangga, hybrid):
+    # Tetangga yang bisa masuk hasil: semua, atau HYBRID_CANDIDATES teratas pada mode hybrid
+    return min(HYBRID_CANDIDATES, jumlah_tetangga) if hybrid else jumlah_tetangga
+
+
+def _jumlah_fallback(bisa_terpilih, top_n):
+    # Fallback hanya menutup kekurangan tetangga, maksimal 50% hasil
+    return min(top_n - min(top_n, bisa_terpilih), top_n // 2)
+
+
+def _pilih_kandidat(kandidat, top_n, hybrid):
+    # Pilih top_n baris dari kandidat: tetangga teratas lalu fallback, atau
+    # sampel acak dari tetangga (maks. HYBRID_CANDIDATES) dan cadangan fallback
+    kandidat_df, jumlah_tetangga, jumlah_fallback = kandidat
+    if hybrid:
+        jumlah = min(HYBRID_CANDIDATES, jumlah_tetangga)
+        tetangga = np.random.choice(jumlah, size=min(top_n, jumlah), replace=False)
+        fallback = jumlah_tetangga + np.random.choice(
+            len(kandidat_df) - jumlah_tetangga, size=jumlah_fallback, replace=False
+        )
+    else:
+        tetangga = np.arange(min(top_n, jumlah_tetangga))
+        fallback = jumlah_tetangga + np.arange(jumlah_fallback)
+
+    terpilih = np.concatenate([tetangga, fallback])
+    skor = kandidat_df['score'].to_numpy()[terpilih]
+    return kandidat_df.iloc[terpilih[np.argsort(-skor, kind='stable')][:top_n]]
+
+
+def _kandidat_tetangga(buku_id, neighbour_index, book_store, usage_filter, score_threshold, jumlah, verbose=False):
+    """
+    Kembalikan (genre buku, posisi tetangga, skor tetangga) untuk `jumlah`
+    tetangga teratas yang lolos threshold. Posisi (int32, baris similarity
+    matrix) dan skor bernilai None jika buku tidak ada di similarity matrix.
+    """
+    # Informasi buku utama
+    buku = book_store.get(buku_id, columns=['book_title', 'genre'])
+    judul_buku = buku['book_title'] if buku else "Tidak ditemukan"
+    kategori_buku = buku['genre'] if buku else "Tidak diketahui"
+
+    if verbose:
+        print(f"\n📚 Rekomendasi untuk Buku ID: {buku_id}")
+        print(f"📝 Judul   : {judul_buku}")
+        print(f"🏷️ Kategori: {kategori_buku}\n")
+
+    if buku_id not in neighbour_index:
+        if verbose:
+            print(f"[!] Buku ID {buku_id} tidak ditemukan di similarity matrix. Menggunakan fallback.")
+        return kategori_buku, None, None
+
+    # Ambil tetangga dari indeks: sudah terurut, tanpa buku itu sendiri,
+    # dan sudah difilter berdasarkan penggunaan (usage_filter).
+    neighbour_posisi, neighbour_scores = neighbour_index.neighbour_positions(buku_id, usage_filter)
+    jumlah_lolos = min(jumlah, np.searchsorted(-neighbour_scores, -score_threshold, side='right'))
+    return kategori_buku, neighbour_posisi[:jumlah_lolos], neighbour_scores[:jumlah_lolos]
+
+
+def _kandidat_tersimpan(
+    buku_id, materialized, neighbour_index, book_store, popularity_table, top_n, hybrid,
+    usage_filter, score_threshold
+):
+    """
+    Seperti `_bangun_kandidat`, dari tabel rekomendasi hasil materialize.py:
+    tetangga teratas dan cadangan fallback buku sudah tersimpan, jadi yang
+    tersisa hanya satu kali ambil metadata. None (hitung langsung) jika tabel
+    dibuat dengan filter/threshold lain atau untuk top_n lebih kecil, buku tidak
+    ada di tabel, baris buku sudah dihitung ulang oleh update inkremental,
+    atau ranking popularitas genrenya berubah sejak model dimuat.
+    """
+    metadata = materialized.metadata
+    if (
+        metadata is None or top_n > metadata['top_n']
+        or usage_filter != metadata['usage_filter'] or score_threshold != metadata['score_threshold']
+    ):
+        return None
+    row = neighbour_index.item_similarity.positions.get(buku_id)
+    if row is None or row in neighbour_index.item_similarity.changed_rows:
+        return None
+    tersimpan = materialized.get(buku_id)
+    if tersimpan is None:
+        return None
+
+    # Daftar tersimpan sudah terurut dan lolos threshold, jadi prefix-nya sama dengan hasil langsung
+    tetangga = tersimpan[tersimpan['posisi'] >= 0][:max(top_n, HYBRID_CANDIDATES)]
+    cadangan = tersimpan[tersimpan['posisi'] < 0]
+    jumlah_fallback = _jumlah_fallback(_bisa_terpilih(len(tetangga), hybrid), top_n)
+    if jumlah_fallback > 0:
+        buku = book_store.get(buku_id, columns=['genre'])
+        if buku and buku['genre'] in popularity_table.changed_genres:
+            return None
+        jumlah_fallback = min(jumlah_fallback, len(cadangan))
+    if jumlah_fallback == 0:
+        cadangan = cadangan[:0]
+    elif not hybrid:
+        cadangan = cadangan[:jumlah_fallback]  # Non-hybrid hanya memakai prefix (urutan popularitas)
+    baris = np.concatenate([tetangga, cadangan])
+
+    # Satu kali ambil metadata untuk tetangga dan fallback sekaligus
+    book_ids = np.where(
+        baris['posisi'] >= 0,
+        neighbour_index.book_ids[np.maximum(baris['posisi'], 0)],
+        book_store.ids.lookup(np.maximum(baris['kode'], 0))
+    )
+    kandidat_df = book_store.take(baris['kode'], ['book_id', 'book_title', 'genre', 'author'], book_ids=book_ids)
+    kandidat_df['score'] = baris['skor'].astype(float)
+    return kandidat_df, len(tetangga), jumlah_fallback
+
+
+def _ambil_metadata(neighbour_index, book_store, posisi):
+    # Posisi similarity -> kode katalog; hanya book_id di luar katalog yang perlu string aslinya
+    return book_store.take(
+        neighbour_index.catalog_codes(posisi), ['book_id', 'book_title', 'genre', 'author'],
+        book_ids=neighbour_index.book_ids[posisi]
+    )
+
+
+# --- Rekomendasi dari Beberapa Buku Sekaligus ---
+def rekomendasi_buku_multi(
+    buku_ids,
+    neighbour_index,
+    book_store,
+    popularity_table,
+    top_n=5,
+    hybrid=False,
+    usage_filter="For Rent",
+    score_threshold=SCORE_THRESHOLD
+):
+    """
+    Rekomendasi gabungan untuk beberapa buku sumber (mis. N peminjaman terakhir
+    user). Tetangga semua buku sumber digabung dalam satu langkah vektor:
+    skor akhir = rata-rata similarity terhadap buku sumber yang dikenal, buku sumber
+    sendiri dibuang, dan setiap buku hanya muncul sekali.
+    """
+    buku_ids = list(dict.fromkeys(buku_ids))
+    posisi_sumber = [neighbour_index.item_similarity.positions[b] for b in buku_ids if b in neighbour_index]
+
+    kolom, skor = [], []
+    with waktu_tahap.time('neighbours'):
+        for buku_id in buku_ids:
+            cols, scores = neighbour_index.neighbour_positions(buku_id, usage_filter)
+            jumlah_lolos = np.searchsorted(-scores, -score_threshold, side='right')
+            kolom.append(cols[:jumlah_lolos])
+            skor.append(scores[:jumlah_lolos])
+
+    with waktu_tahap.time('top_n'):
+        cols = np.concatenate(kolom) if kolom else np.empty(0, dtype=np.int32)
+        scores = np.concatenate(skor).astype(float) if skor else np.empty(0)
+        posisi, inverse = np.unique(cols, return_inverse=True)
+        total = np.bincount(inverse, weights=scores, minlength=len(posisi)) / max(len(posisi_sumber), 1)
+
+        bukan_sumber = ~np.isin(posisi, posisi_sumber)
+        posisi, total = posisi[bukan_sumber], total[bukan_sumber]
+        urutan = np.lexsort((posisi, -total))
+        posisi, total = posisi[urutan], total[urutan]
+
+        if hybrid:
+            kandidat = min(HYBRID_CANDIDATES, len(posisi))
+            terpilih = np.random.choice(kandidat, size=min(top_n, kandidat), replace=False)
+        else:
+            terpilih = np.arange(min(top_n, len(posisi)))
+
+    with waktu_tahap.time('enrich'):
+        hasil_df = _ambil_metadata(neighbour_index, book_store, posisi[terpilih])
+        hasil_df['score'] = total[terpilih]
+
+        # Fallback diambil dari genre buku sumber, berurutan sesuai input
+        kategori = []
+        for buku_id in buku_ids:
+            buku = book_store.get(buku_id, columns=['genre'])
+            if buku and buku['genre'] not in kategori:
+                kategori.append(buku['genre'])
+    return _lengkapi_dengan_fallback(hasil_df, popularity_table, kategori, buku_ids, top_n, usage_filter, hybrid)
+
+
+def _lengkapi_dengan_fallback(hasil_df, popularity_table, kategori, buku_ids, top_n, usage_filter, hybrid):
+    # Tambahkan fallback jika hasil belum cukup
+    jumlah_rekomendasi = len(hasil_df)
+    if jumlah_rekomendasi < top_n:
+        kekurangan = top_n - jumlah_rekomendasi
+        max_fallback = top_n // 2  # Maksimal 50% fallback
+        fallback_needed = min(kekurangan, max_fallback)
+
+        with waktu_tahap.time('fallback'):
+            exclude_ids = set(hasil_df['book_id'].tolist()) | set(buku_ids)
+            fallback_dfs = [hasil_df]
+            for kategori_buku in kategori:
+                if fallback_needed <= 0:
+                    break
+                fallback_df = fallback_rekomendasi(
+                    popularity_table,
+                    kategori_buku, buku_ids[0], fallback_needed, usage_filter, hybrid,
+                    exclude_ids=exclude_ids
+                )
+                exclude_ids.update(fallback_df['book_id'])
+                fallback_needed -= len(fallback_df)
+                fallback_dfs.append(fallback_df)
+            hasil_df = pd.concat(fallback_dfs, ignore_index=True)
+
+    hasil_df = hasil_df.drop_duplicates(subset='book_id')
+    return hasil_df[['book_id', 'book_title', 'genre', 'author', 'score']].sort_values(by='score', ascending=False).head(top_n)
+
+
+# --- Fallback Helper ---
+def fallback_rekomendasi(
+    popularity_table,
+    kategori_buku,
+    buku_id,
+    jumlah,
+    usage_filter,
+    hybrid,
+    exclude_ids=None
+):
+    if exclude_ids is None:
+        exclude_ids = set()
+    exclude_ids.add(buku_id)
+
+    # Ambil langsung dari ranking popularitas per genre yang sudah dihitung
+    return popularity_table.top(kategori_buku, jumlah, usage_filter, exclude_ids=exclude_ids, hybrid=hybrid)
@@ -0,0 +1,394 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.ids import IdDictionary
+
+# Parameter default pembangunan matriks similarity
+TOP_K_NEIGHBOURS = 50
+SCORE_THRESHOLD = 0.3
+CHUNK_SIZE = 1024
+COMPACT_RATIO = 0.1  # Gabungkan overlay ke CSR jika >10% baris sudah ditimpa
+DEFAULT_USAGE_FILTER = "For Rent"
+
+
+class SparseItemSimilarity:
+    """
+    Item-item cosine similarity yang hanya menyimpan top-K tetangga per buku
+    (skor >= score_threshold) dalam bentuk CSR. Setiap baris sudah terurut
+    berdasarkan skor secara menurun dan tidak memuat buku itu sendiri.
+
+    Peminjaman baru dapat ditambahkan lewat `add_loans` tanpa membangun ulang
+    seluruh matriks: hanya baris buku yang terdampak yang dihitung ulang dan
+    disimpan di overlay, yang sesekali digabungkan kembali ke CSR (`compact`).
+
+    UUID buku dan user di-intern sebagai kode int32 (IdDictionary): kode buku
+    adalah nomor baris matriks, dan update inkremental bekerja pada kode user.
+    """
+
+    def __init__(self, matrix, book_ids, item_user=None, user_ids=None,
+                 top_k=TOP_K_NEIGHBOURS, score_threshold=SCORE_THRESHOLD):
+        self.matrix = matrix
+        self.ids = IdDictionary(np.asarray(book_ids).tolist())  # book_id -> baris
+        self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.version = 0
+
+        # Matriks item x user (jumlah peminjaman) untuk update inkremental
+        self.item_user = item_user
+        self.user_ids = user_ids
+        self._overrides = {}
+        self.changed_rows = set()  # Baris yang dihitung ulang oleh add_loans sejak matriks dibangun/dimuat
+        self.users = None  # user_id -> kode, dibentuk bersama adjacency
+        self._book_users = None
+        self._user_books = None
+        self._norms_sq = None
+
+    @classmethod
+    def from_loans(cls, peminjaman_df, top_k=TOP_K_NEIGHBOURS, score_threshold=SCORE_THRESHOLD):
+        book_codes, book_ids = pd.factorize(peminjaman_df['book_id'])
+        user_codes, user_ids = pd.factorize(peminjaman_df['user_id'])
+
+        # Matriks item x user, duplikat (user, buku) dijumlahkan menjadi rating
+        item_user = sparse.csr_matrix(
+            (np.ones(len(book_codes), dtype=np.float64), (book_codes, user_codes)),
+            shape=(len(book_ids), len(user_ids))
+        )
+        item_user.sum_duplicates()
+
+        # Normalisasi L2 per buku sehingga dot product = cosine similarity
+        norms = np.sqrt(np.asarray(item_user.multiply(item_user).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        item_user_norm = (sparse.diags(1.0 / norms) @ item_user).tocsr()
+        user_item = item_user_norm.T.tocsr()
+
+        indptr = [0]
+        indices = []
+        data = []
+        for start in range(0, item_user_norm.shape[0], CHUNK_SIZE):
+            # Hitung per blok agar matriks similarity penuh tidak pernah dibentuk
+            block = (item_user_norm[start:start + CHUNK_SIZE] @ user_item).tocsr()
+            for offset in range(block.shape[0]):
+                row = start + offset
+                cols, scores = _top_k_row(block, offset, row, top_k, score_threshold)
+                indices.append(cols)
+                data.append(scores)
+                indptr.append(indptr[-1] + len(cols))
+
+        matrix = sparse.csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0, dtype=np.float32),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(book_ids), len(book_ids))
+        )
+        return cls(
+            matrix, np.asarray(book_ids), item_user=item_user, user_ids=np.asarray(user_ids),
+            top_k=top_k, score_threshold=score_threshold
+        )
+
+    @property
+    def book_ids(self):
+        return self.ids.values
+
+    @property
+    def positions(self):
+        return self.ids
+
+    def __contains__(self, book_id):
+        return book_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def neighbours(self, book_id):
+        """Kembalikan (book_ids, scores) tetangga sebuah buku, terurut menurun."""
+        row = self.positions.get(book_id)
+        if row is None:
+            return self.book_ids[:0], np.empty(0, dtype=np.float32)
+        cols, scores = self.row(row)
+        return self.book_ids[cols], scores
+
+    def loan_counts(self):
+        """Jumlah peminjaman per buku {book_id: count} dari matriks item x user."""
+        counts = np.asarray(self.item_user.sum(axis=1)).ravel()
+        return dict(zip(self.book_ids[:len(counts)].tolist(), counts.astype(int).tolist()))
+
+    def row(self, row):
+        """Kembalikan (posisi tetangga, scores) untuk baris `row`, termasuk overlay."""
+        override = self._overrides.get(row)
+        if override is not None:
+            return override
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return self.matrix.indices[start:end], self.matrix.data[start:end]
+
+    def is_overridden(self, row):
+        return row in self._overrides
+
+    def add_loans(self, loans):
+        """
+        Tambahkan peminjaman baru [(user_id, book_id), ...]. Yang dihitung ulang
+        hanya baris buku yang dipinjam dan buku lain yang pernah dipinjam oleh
+        peminjam buku tersebut (hanya skor merekalah yang berubah).
+        Mengembalikan (book_ids yang dipinjam, book_ids baru di matriks).
+        """
+        if self._book_users is None:
+            self._build_adjacency()
+
+        # Buku baru mendapat baris berikutnya, tetapi book_id-nya baru di-intern
+        # setelah barisnya ada di overlay (lihat di bawah)
+        n_lama = len(self.ids)
+        new_ids = {}  # book_id baru -> baris
+        touched = set()
+        loan_rows, loan_users = [], []
+        for user_id, book_id in loans:
+            row = self.ids.get(book_id, new_ids.get(book_id))
+            if row is None:
+                row = new_ids[book_id] = n_lama + len(new_ids)
+                self._book_users.append({})
+                self._norms_sq.append(0.0)
+            user = self.users.get(user_id)
+            if user is None:
+                user = int(self.users.add([user_id])[0])
+                self._user_books.append({})
+
+            count = self._book_users[row].get(user, 0)
+            self._book_users[row][user] = count + 1
+            self._user_books[user][row] = count + 1
+            self._norms_sq[row] += 2 * count + 1
+            touched.add(row)
+            loan_rows.append(row)
+            loan_users.append(user)
+
+        affected = set(touched)
+        for row in touched:
+            for user in self._book_users[row]:
+                affected.update(self._user_books[user])
+        overrides = {row: self._compute_row(row) for row in affected}
+
+        # Urutan publikasi untuk pembaca yang berjalan bersamaan: baris buku baru
+        # masuk overlay dulu, baru book_id-nya di-intern, sehingga book_id yang
+        # sudah bisa ditemukan selalu punya baris. Baris lama (yang bisa menunjuk
+        # ke buku baru) ditimpa setelah buku baru punya book_id.
+        for row, override in overrides.items():
+            if row >= n_lama:
+                self._overrides[row] = override
+        self.ids.add(new_ids)
+        for row, override in overrides.items():
+            if row < n_lama:
+                self._overrides[row] = override
+        self.changed_rows.update(affected)
+        self._fold_loans(loan_rows, loan_users)
+
+        if len(self._overrides) > COMPACT_RATIO * len(self.book_ids):
+            self.compact()
+        return [self.book_ids[row] for row in touched], list(new_ids)
+
+    def compact(self):
+        """Gabungkan overlay ke dalam CSR baru dan kosongkan overlay."""
+        n = len(self.book_ids)
+        indptr = [0]
+        indices = []
+        data = []
+        for row in range(n):
+            if row < self.matrix.shape[0] or row in self._overrides:
+                cols, scores = self.row(row)
+            else:
+                cols, scores = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+            indices.append(cols)
+            data.append(scores)
+            indptr.append(indptr[-1] + len(cols))
+
+        # Ganti matriks lebih dulu agar pembaca yang melihat overlay kosong
+        # sudah mendapatkan matriks yang baru
+        self.matrix = sparse.csr_matrix(
+            (
+                np.concatenate(data).astype(np.float32, copy=False),
+                np.concatenate(indices).astype(np.int32, copy=False),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(n, n)
+        )
+        self._overrides = {}
+        self.version += 1
+
+    def _fold_loans(self, rows, users):
+        # Tambahkan peminjaman ke matriks item x user (dipakai loan_counts dan
+        # saat model disimpan). Matriks baru dibentuk lalu dipasang sekaligus;
+        # user_ids dipasang lebih dulu agar setiap kolom matriks punya user_id.
+        item_user = self.item_user.tocsr()
+        n_rows, n_users = len(self.ids), len(self.users)
+        indptr = np.concatenate([
+            item_user.indptr, np.full(n_rows - item_user.shape[0], item_user.indptr[-1], dtype=item_user.indptr.dtype)
+        ])
+        lama = sparse.csr_matrix((item_user.data, item_user.indices, indptr), shape=(n_rows, n_users))
+        baru = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=item_user.dtype), (rows, users)), shape=(n_rows, n_users)
+        )
+        self.user_ids = self.users.values
+        self.item_user = (lama + baru).tocsr()
+
+    def _build_adjacency(self):
+        # Bentuk daftar adjacency buku->user dan user->buku dari matriks item x
+        # user; kode user = kolom matriks, user baru mendapat kode berikutnya
+        item_user = self.item_user.tocsr()
+        self.users = IdDictionary(np.asarray(self.user_ids).tolist())
+        self._book_users = []
+        self._user_books = [{} for _ in range(len(self.users))]
+        self._norms_sq = []
+        for row in range(item_user.shape[0]):
+            start, end = item_user.indptr[row], item_user.indptr[row + 1]
+            users = item_user.indices[start:end].tolist()
+            counts = item_user.data[start:end].tolist()
+            self._book_users.append(dict(zip(users, counts)))
+            self._norms_sq.append(float(sum(c * c for c in counts)))
+            for user, count in zip(users, counts):
+                self._user_books[user][row] = count
+
+    def _compute_row(self, row):
+        dots = {}
+        for user, count in self._book_users[row].items():
+            for other, other_count in self._user_books[user].items():
+                if other != row:
+                    dots[other] = dots.get(other, 0.0) + count * other_count
+        if not dots:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        cols = np.fromiter(dots.keys(), dtype=np.int64, count=len(dots))
+        other_norms_sq = np.fromiter((self._norms_sq[other] for other in dots), dtype=np.float64, count=len(dots))
+        scores = np.fromiter(dots.values(), dtype=np.float64, count=len(dots))
+        scores = scores / np.sqrt(self._norms_sq[row] * other_norms_sq)
+        return _select_top_k(cols, scores, self.top_k, self.score_threshold)
+
+
+class NeighbourIndex:
+    """
+    Indeks tetangga per buku yang sudah difilter berdasarkan kolom `usage`.
+    Untuk setiap filter disimpan array CSR ringkas (indptr, posisi tetangga,
+    skor) yang tetap terurut menurun, sehingga lookup cukup berupa slice.
+    Filter selain default dibangun sekali saat pertama kali diminta.
+
+    Baris yang ada di overlay similarity (hasil `add_loans`) difilter langsung
+    saat lookup; indeks dibangun ulang setelah similarity di-`compact`.
+
+    `catalog_ids` memetakan book_id ke kode katalog; berikan `BookStore.ids`
+    agar `catalog_codes` langsung menjadi baris BookStore (lihat `take`).
+    """
+
+    def __init__(self, item_similarity, book_df, usage_filters=(DEFAULT_USAGE_FILTER,), catalog_ids=None):
+        self.item_similarity = item_similarity
+        books = book_df.drop_duplicates(subset='book_id')
+        self.catalog_ids = catalog_ids if catalog_ids is not None else IdDictionary(books['book_id'])
+        self._catalog_usage = np.full(len(self.catalog_ids), np.nan, dtype=object)
+        codes = self.catalog_ids.codes(books['book_id'])
+        self._catalog_usage[codes[codes >= 0]] = books['usage'].to_numpy(dtype=object)[codes >= 0]
+        self._codes = np.empty(0, dtype=np.int32)
+        self._usage_filters = tuple(usage_filters)
+        self._rebuild()
+
+    @property
+    def book_ids(self):
+        return self.item_similarity.book_ids
+
+    def __contains__(self, book_id):
+        return book_id in self.item_similarity
+
+    def __len__(self):
+        return len(self.item_similarity)
+
+    def _rebuild(self):
+        usage_filters = set(self._usage_filters) | set(getattr(self, '_filtered', {}))
+        self._version = self.item_similarity.version
+        codes = self.catalog_codes(np.arange(len(self.book_ids)))
+        usage = np.full(len(codes), np.nan, dtype=object)
+        usage[codes >= 0] = self._catalog_usage[codes[codes >= 0]]
+        self._usage = pd.Series(usage, dtype=object)
+        self._allowed = {}
+        self._filtered = {}
+        for usage_filter in usage_filters:
+            self._filtered[usage_filter] = self._build(usage_filter)
+
+    def _build(self, usage_filter):
+        matrix = self.item_similarity.matrix
+        if not usage_filter:
+            return matrix.indptr, matrix.indices, matrix.data
+
+        allowed = self._usage.str.contains(usage_filter, na=False, regex=False).to_numpy(dtype=bool)
+        self._allowed[usage_filter] = allowed
+        keep = allowed[matrix.indices]
+        kept_before = np.concatenate(([0], np.cumsum(keep)))
+        indptr = kept_before[matrix.indptr]
+        return indptr, matrix.indices[keep], matrix.data[keep]
+
+    def _allowed_mask(self, usage_filter, cols):
+        allowed = self._allowed[usage_filter]
+        known = cols < len(allowed)
+        mask = np.zeros(len(cols), dtype=bool)
+        mask[known] = allowed[cols[known]]
+        # Buku yang baru masuk matriks setelah indeks dibangun
+        for i, code in zip(np.flatnonzero(~known), self.catalog_codes(cols[~known])):
+            usage = self._catalog_usage[code] if code >= 0 else None
+            mask[i] = isinstance(usage, str) and usage_filter in usage
+        return mask
+
+    def catalog_codes(self, cols):
+        """Kode katalog (int32) untuk posisi similarity `cols`; -1 untuk buku di luar katalog."""
+        codes = self._codes
+        if len(codes) < len(self.book_ids):
+            # Buku yang masuk matriks sejak terakhir dipetakan (add_loans)
+            extra = self.catalog_ids.codes(self.book_ids[len(codes):])
+            codes = self._codes = np.concatenate([codes, extra])
+        return codes[cols]
+
+    def neighbours(self, book_id, usage_filter=DEFAULT_USAGE_FILTER):
+        """Kembalikan (book_ids, scores) tetangga yang lolos filter usage, terurut menurun."""
+        cols, scores = self.neighbour_positions(book_id, usage_filter)
+        return self.book_ids[cols], scores
+
+    def neighbour_positions(self, book_id, usage_filter=DEFAULT_USAGE_FILTER):
+        """Seperti `neighbours`, tetapi mengembalikan posisi buku (int) alih-alih book_id."""
+        row = self.item_similarity.positions.get(book_id)
+        if row is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        if self._version != self.item_similarity.version:
+            self._rebuild()
+        filtered = self._filtered.get(usage_filter)
+        if filtered is None:
+            filtered = self._filtered[usage_filter] = self._build(usage_filter)
+
+        if self.item_similarity.is_overridden(row):
+            cols, scores = self.item_similarity.row(row)
+            if usage_filter:
+                mask = self._allowed_mask(usage_filter, cols)
+                cols, scores = cols[mask], scores[mask]
+            return cols, scores
+
+        indptr, indices, data = filtered
+        start, end = indptr[row], indptr[row + 1]
+        return indices[start:end], data[start:end]
+
+
+def _top_k_row(block, offset, row, top_k, score_threshold):
+    start, end = block.indptr[offset], block.indptr[offset + 1]
+    cols = block.indices[start:end]
+    scores = block.data[start:end]
+    keep = cols != row
+    return _select_top_k(cols[keep], scores[keep], top_k, score_threshold)
+
+
+def _select_top_k(cols, scores, top_k, score_threshold):
+    keep = scores >= score_threshold
+    cols, scores = cols[keep], scores[keep]
+
+    if len(scores) > top_k:
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        cols, scores = cols[top], scores[top]
+
+    order = np.argsort(-scores, kind='stable')
+    return cols[order].astype(np.int32), scores[order].astype(np.float32)
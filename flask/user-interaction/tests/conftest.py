@@ -0,0 +1,9 @@
+import os
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modul service diimpor langsung (seperti `python app.py`), dan path data/ serta
+# artifacts/ relatif terhadap direktori service
+sys.path.insert(0, SERVICE_DIR)
+os.chdir(SERVICE_DIR)
@@ -0,0 +1,34 @@
+import pytest
+
+from app import app
+from recommendation import model_slot
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def buku_id():
+    # Buku yang punya tetangga di similarity matrix
+    return str(model_slot.get().neighbour_index.book_ids[0])
+
+
+@pytest.mark.parametrize('top_n', ['-3', '0', 'abc', '2.5'])
+def test_top_n_tidak_valid_ditolak(client, buku_id, top_n):
+    respons = client.get('/recommendation', query_string={'book_id': buku_id, 'top_n': top_n})
+    assert respons.status_code == 400
+    assert 'top_n' in respons.get_json()['error']
+
+
+@pytest.mark.parametrize('top_n', [-1, 'abc', True])
+def test_batch_top_n_tidak_valid_ditolak(client, buku_id, top_n):
+    respons = client.post('/recommendation/batch', json={'book_ids': [buku_id], 'top_n': top_n})
+    assert respons.status_code == 400
+
+
+def test_top_n_valid(client, buku_id):
+    respons = client.get('/recommendation', query_string={'book_id': buku_id, 'top_n': '3'})
+    assert respons.status_code == 200
+    assert 0 < len(respons.get_json()['rekomendasi']) <= 3
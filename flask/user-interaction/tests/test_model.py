@@ -0,0 +1,21 @@
+import model as model_module
+from model import RecommenderModel
+
+
+def test_refresh_tanpa_artifact_mempertahankan_model_jika_csv_tidak_berubah(tmp_path):
+    sekarang = RecommenderModel.muat_atau_bangun(directory=str(tmp_path))
+    assert sekarang.versi is None and sekarang.sumber is not None
+
+    # Peminjaman dari POST /loans hanya ada di model yang sedang berjalan
+    sekarang.item_similarity.add_loans([('user-baru', 'buku-baru')])
+    assert RecommenderModel.muat_atau_bangun(sekarang, directory=str(tmp_path)) is sekarang
+
+
+def test_refresh_tanpa_artifact_membangun_ulang_jika_csv_berubah(tmp_path, monkeypatch):
+    sekarang = RecommenderModel.muat_atau_bangun(directory=str(tmp_path))
+    tanda = sekarang.sumber
+    monkeypatch.setattr(model_module, 'tanda_sumber', lambda: tanda + (('data/baru.csv', 0, 0),))
+
+    baru = RecommenderModel.muat_atau_bangun(sekarang, directory=str(tmp_path))
+    assert baru is not sekarang
+    assert baru.sumber != tanda
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+import materialize
+from model import RecommenderModel
+from popularity import PopularityTable
+from ranking import KANDIDAT_DTYPE, rekomendasi_buku_precision_optimal
+from similarity import DEFAULT_USAGE_FILTER, SCORE_THRESHOLD
+
+from common.book_store import BookStore
+from common.cache import TTLCache
+from common.topn_store import TopNStore, write_store
+
+TOP_N = 10
+
+
+@pytest.fixture(scope='module')
+def model():
+    return RecommenderModel.muat_atau_bangun()
+
+
+def _buku_dengan_fallback(model):
+    # Buku yang tetangganya kurang dari TOP_N, sehingga hasilnya memakai fallback
+    for buku_id in model.neighbour_index.book_ids:
+        _, skor = model.neighbour_index.neighbour_positions(buku_id)
+        if 0 < np.count_nonzero(skor >= SCORE_THRESHOLD) < TOP_N:
+            return buku_id
+    pytest.skip("Tidak ada buku yang memakai fallback di data ini")
+
+
+def _buku_di_luar_matriks(model):
+    # Buku katalog tanpa riwayat peminjaman: hasilnya sepenuhnya fallback
+    for buku_id in model.book_df['book_id']:
+        if buku_id not in model.neighbour_index:
+            return buku_id
+    pytest.skip("Semua buku katalog ada di similarity matrix")
+
+
+def _rekomendasi(model, buku_id, cache, hybrid=True):
+    return rekomendasi_buku_precision_optimal(
+        buku_id, model.neighbour_index, model.book_store, model.popularity_table,
+        top_n=TOP_N, hybrid=hybrid, cache=cache
+    )
+
+
+@pytest.mark.parametrize('hybrid', [True, False])
+@pytest.mark.parametrize('jenis_buku', ['tetangga', 'di_luar_matriks'])
+def test_cache_hit_tanpa_metadata_dan_fallback(model, monkeypatch, hybrid, jenis_buku):
+    buku_id = _buku_dengan_fallback(model) if jenis_buku == 'tetangga' else _buku_di_luar_matriks(model)
+    cache = TTLCache(maxsize=16, ttl=60)
+    pertama = _rekomendasi(model, buku_id, cache, hybrid)
+    assert (pertama['score'] == 0).any()  # Sebagian hasil berasal dari fallback
+
+    def dilarang(*args, **kwargs):
+        raise AssertionError("cache hit tidak boleh memanggil BookStore.take atau PopularityTable.top")
+
+    monkeypatch.setattr(BookStore, 'take', dilarang)
+    monkeypatch.setattr(PopularityTable, 'top', dilarang)
+    for _ in range(5):
+        hasil = _rekomendasi(model, buku_id, cache, hybrid)
+        assert len(hasil) == len(pertama)
+        assert not hasil['book_id'].duplicated().any()
+        assert buku_id not in set(hasil['book_id'])
+        assert hasil['score'].is_monotonic_decreasing
+        if not hybrid:
+            assert hasil.to_dict(orient='records') == pertama.to_dict(orient='records')
+
+
+def test_tabel_rekomendasi_sama_dengan_hitung_langsung(model, tmp_path, monkeypatch):
+    monkeypatch.setitem(materialize._state, 'model', model)
+    baris = materialize._hitung_shard(
+        0, len(model.neighbour_index.book_ids), TOP_N, DEFAULT_USAGE_FILTER, SCORE_THRESHOLD
+    )
+    path = str(tmp_path / 'rekomendasi.sqlite')
+    write_store(path, baris, 'v1', KANDIDAT_DTYPE, metadata={
+        'model': 'user-interaction', 'top_n': TOP_N,
+        'usage_filter': DEFAULT_USAGE_FILTER, 'score_threshold': SCORE_THRESHOLD,
+    })
+    tabel = TopNStore(path, 'v1')
+
+    for buku_id in [_buku_dengan_fallback(model), *model.neighbour_index.book_ids[:50]]:
+        assert tabel.get(buku_id) is not None
+        for top_n in (1, 6, TOP_N):
+            langsung = rekomendasi_buku_precision_optimal(
+                buku_id, model.neighbour_index, model.book_store, model.popularity_table, top_n=top_n
+            )
+            tersimpan = rekomendasi_buku_precision_optimal(
+                buku_id, model.neighbour_index, model.book_store, model.popularity_table, top_n=top_n,
+                materialized=tabel
+            )
+            assert tersimpan.to_dict(orient='records') == langsung.to_dict(orient='records')
+    tabel.close()
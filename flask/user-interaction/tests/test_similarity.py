@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from similarity import SparseItemSimilarity
+
+
+def _similarity():
+    peminjaman_df = pd.DataFrame({
+        'user_id': ['u1', 'u1', 'u2', 'u2', 'u3'],
+        'book_id': ['a', 'b', 'a', 'b', 'c'],
+    })
+    return SparseItemSimilarity.from_loans(peminjaman_df, score_threshold=0.0)
+
+
+def test_add_loans_hitung_ulang_baris_terdampak():
+    similarity = _similarity()
+    dipinjam, baru = similarity.add_loans([('u3', 'a')])
+
+    assert dipinjam == ['a'] and baru == []
+    book_ids, _ = similarity.neighbours('c')
+    assert 'a' in book_ids.tolist()
+
+
+def test_add_loans_buku_baru_punya_baris_sebelum_di_intern(monkeypatch):
+    similarity = _similarity()
+    n_lama = len(similarity)
+    add_asli = similarity.ids.add
+    saat_intern = []
+
+    def add(ids):
+        # Pembaca yang menemukan book_id baru harus langsung bisa membaca barisnya
+        ids = list(ids)
+        saat_intern.append([similarity.is_overridden(n_lama + i) for i in range(len(ids))])
+        return add_asli(ids)
+
+    monkeypatch.setattr(similarity.ids, 'add', add)
+    dipinjam, baru = similarity.add_loans([('u1', 'd'), ('u2', 'd'), ('u1', 'e')])
+
+    assert baru == ['d', 'e']
+    assert saat_intern == [[True, True]]
+    assert similarity.positions['d'] == n_lama and similarity.positions['e'] == n_lama + 1
+    book_ids, scores = similarity.neighbours('d')
+    assert {'a', 'b', 'e'} <= set(book_ids.tolist())
+    assert np.all(np.diff(scores) <= 0)
+    # Baris lama juga menunjuk ke buku baru
+    assert 'd' in similarity.neighbours('a')[0].tolist()
+
+
+def test_add_loans_memperbarui_loan_counts():
+    similarity = _similarity()
+    similarity.add_loans([('u3', 'a'), ('u4', 'd'), ('u1', 'a')])
+
+    assert similarity.loan_counts() == {'a': 4, 'b': 2, 'c': 1, 'd': 1}
+    assert similarity.item_user.shape == (4, 4)
+    assert similarity.user_ids.tolist() == ['u1', 'u2', 'u3', 'u4']
@@ -1,27 +1,80 @@
+import logging
 import os
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from db import db  # <-- import db from db.py
-from recommendation import get_recommendations_for_user
 
+load_dotenv()  # Loads from .env by default
+# Per-request [LOG] output is at DEBUG; run with LOG_LEVEL=DEBUG to see it
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='[%(levelname)s] %(name)s: %(message)s')
 
-app = Flask(__name__)
+from db import db, engine_options  # <-- import db from db.py
+from recommendation import (
+    MAX_BATCH_IDS,
+    get_recommendations_for_user,
+    get_recommendations_for_users,
+    invalidate_recommendations,
+    model_slot,
+    read_top_n,
+)
+from common.prometheus import CONTENT_TYPE, REGISTRY
 
-load_dotenv()  # Loads from .env by default
+
+app = Flask(__name__)
 
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 db.init_app(app)
 CORS(app)
 
+MODEL_REFRESH_INTERVAL = float(os.getenv('MODEL_REFRESH_INTERVAL', 0))  # Seconds between model rebuilds; 0 disables
+if MODEL_REFRESH_INTERVAL > 0:
+    model_slot.start(MODEL_REFRESH_INTERVAL)
+
 @app.route('/user-preferences/recommendation')
 def personalized_recommendation():
     pref_id = request.args.get('id')
-    top_n = int(request.args.get('top_n', 5))  # <-- get top_n from query string, default 5
+    top_n = read_top_n(request.args.get('top_n', 5))  # <-- get top_n from query string, default 5
+    if top_n is None:
+        return jsonify({"error": "top_n must be an integer >= 1"}), 400
     recommendations = get_recommendations_for_user(pref_id, top_n=top_n)
     return jsonify({"recommendations": recommendations})
 
+@app.route('/user-preferences/recommendation/batch', methods=['GET', 'POST'])
+def personalized_recommendation_batch():
+    body = request.get_json(silent=True) or {}
+    pref_ids = body.get('ids')
+    if pref_ids is None:
+        pref_ids = [pref_id for pref_id in request.args.get('ids', '').split(',') if pref_id]
+    if not isinstance(pref_ids, list) or not pref_ids:
+        return jsonify({"error": "ids must be a non-empty list of preference ids"}), 400
+    if len(pref_ids) > MAX_BATCH_IDS:
+        return jsonify({"error": f"at most {MAX_BATCH_IDS} ids per request"}), 400
+    top_n = read_top_n(body.get('top_n', request.args.get('top_n', 5)))
+    if top_n is None:
+        return jsonify({"error": "top_n must be an integer >= 1"}), 400
+    recommendations = get_recommendations_for_users(pref_ids, top_n=top_n)
+    return jsonify({"recommendations": recommendations})
+
+@app.route('/user-preferences/recommendation/invalidate', methods=['POST'])
+def invalidate_recommendation_cache():
+    body = request.get_json(silent=True) or {}
+    pref_id = body.get('id', request.args.get('id'))
+    if not pref_id:
+        return jsonify({"error": "id is required"}), 400
+    return jsonify({"id": pref_id, "invalidated": invalidate_recommendations(pref_id)})
+
+@app.route('/model/reload', methods=['POST'])
+def reload_model():
+    # Rebuilds in the background; requests keep using the current model until the swap
+    started = model_slot.reload_in_background()
+    return jsonify({"reload": "started" if started else "already running"}), 202
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(port=5001)
@@ -0,0 +1,127 @@
+"""
+Asyncio serving mode for the preferences service.
+
+Same routes as app.py, served by Quart on an ASGI server, e.g.:
+
+    pip install -r requirements.txt
+    hypercorn asgi:app --bind 0.0.0.0:5001
+
+Preferences are read through a pooled async engine (asyncpg), so waiting on
+Postgres never blocks a worker. Everything else that blocks runs in a thread
+pool: the result cache and materialized-table lookups (SQLite reads plus
+enrichment) and the CPU-bound scoring; NumPy releases the GIL during the
+matrix products.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+
+load_dotenv()  # Loads from .env by default
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='[%(levelname)s] %(name)s: %(message)s')
+
+import async_db
+from db import engine_options
+from recommendation import (
+    MAX_BATCH_IDS,
+    RESULT_CACHE_CHECK_UPDATED_AT,
+    invalidate_recommendations,
+    lookup_cached_results,
+    model_slot,
+    read_top_n,
+    recommend_for_preferences,
+    stage_seconds,
+)
+from common.prometheus import CONTENT_TYPE, REGISTRY
+
+SCORING_WORKERS = int(os.getenv('SCORING_WORKERS', os.cpu_count() or 4))
+MODEL_REFRESH_INTERVAL = float(os.getenv('MODEL_REFRESH_INTERVAL', 0))  # Seconds between model rebuilds; 0 disables
+
+app = Quart(__name__)
+app = cors(app)
+scoring_executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix='scoring')
+
+@app.before_serving
+async def startup():
+    database_url = os.getenv('DATABASE_URL')
+    async_db.init_engine(database_url, **engine_options(database_url))
+    if MODEL_REFRESH_INTERVAL > 0:
+        model_slot.start(MODEL_REFRESH_INTERVAL)
+
+@app.after_serving
+async def shutdown():
+    await async_db.dispose_engine()
+    model_slot.stop()
+    scoring_executor.shutdown(wait=False)
+
+async def recommendations_for(pref_ids, top_n):
+    """
+    Async counterpart of get_recommendations_for_users: await the DB, and
+    run the cache/materialized lookups and the scoring in the executor so
+    the event loop never blocks on SQLite reads or enrichment.
+    """
+    pref_ids = list(dict.fromkeys(str(pref_id) for pref_id in pref_ids))
+    loop = asyncio.get_running_loop()
+    with stage_seconds.time('db_fetch'):
+        versions = await async_db.get_preference_versions(pref_ids) if RESULT_CACHE_CHECK_UPDATED_AT else {}
+    results, missing = await loop.run_in_executor(scoring_executor, lookup_cached_results, pref_ids, top_n, versions)
+    if missing:
+        with stage_seconds.time('db_fetch'):
+            prefs_by_id = await async_db.get_many_user_preferences(missing)
+        results.update(await loop.run_in_executor(
+            scoring_executor, recommend_for_preferences, prefs_by_id, top_n, versions
+        ))
+    return results
+
+@app.route('/user-preferences/recommendation')
+async def personalized_recommendation():
+    pref_id = request.args.get('id')
+    top_n = read_top_n(request.args.get('top_n', 5))
+    if top_n is None:
+        return jsonify({"error": "top_n must be an integer >= 1"}), 400
+    if not pref_id:
+        return jsonify({"recommendations": []})
+    recommendations = await recommendations_for([pref_id], top_n)
+    return jsonify({"recommendations": recommendations[pref_id]})
+
+@app.route('/user-preferences/recommendation/batch', methods=['GET', 'POST'])
+async def personalized_recommendation_batch():
+    body = await request.get_json(silent=True) or {}
+    pref_ids = body.get('ids')
+    if pref_ids is None:
+        pref_ids = [pref_id for pref_id in request.args.get('ids', '').split(',') if pref_id]
+    if not isinstance(pref_ids, list) or not pref_ids:
+        return jsonify({"error": "ids must be a non-empty list of preference ids"}), 400
+    if len(pref_ids) > MAX_BATCH_IDS:
+        return jsonify({"error": f"at most {MAX_BATCH_IDS} ids per request"}), 400
+    top_n = read_top_n(body.get('top_n', request.args.get('top_n', 5)))
+    if top_n is None:
+        return jsonify({"error": "top_n must be an integer >= 1"}), 400
+    recommendations = await recommendations_for(pref_ids, top_n)
+    return jsonify({"recommendations": recommendations})
+
+@app.route('/user-preferences/recommendation/invalidate', methods=['POST'])
+async def invalidate_recommendation_cache():
+    body = await request.get_json(silent=True) or {}
+    pref_id = body.get('id', request.args.get('id'))
+    if not pref_id:
+        return jsonify({"error": "id is required"}), 400
+    # Also deletes from the materialized table (a SQLite write), so off the event loop
+    loop = asyncio.get_running_loop()
+    invalidated = await loop.run_in_executor(scoring_executor, invalidate_recommendations, pref_id)
+    return jsonify({"id": pref_id, "invalidated": invalidated})
+
+@app.route('/model/reload', methods=['POST'])
+async def reload_model():
+    started = model_slot.reload_in_background()
+    return jsonify({"reload": "started" if started else "already running"}), 202
+
+@app.route('/metrics')
+async def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+if __name__ == '__main__':
+    app.run(port=5001)
@@ -0,0 +1,45 @@
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from db import PREFERENCE_COLUMNS, Preference
+from recommendation import preference_to_dict
+
+# Sync driver names in DATABASE_URL mapped to their asyncio counterparts
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+engine = None
+
+def async_database_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+def init_engine(url, **engine_options):
+    """Create the pooled async engine; call once at startup."""
+    global engine
+    engine = create_async_engine(async_database_url(url), **engine_options)
+    return engine
+
+async def dispose_engine():
+    if engine is not None:
+        await engine.dispose()
+
+async def get_many_user_preferences(pref_ids):
+    """Fetch several preferences with a single query, as {pref_id: prefs}."""
+    if not pref_ids:
+        return {}
+    async with engine.connect() as conn:
+        result = await conn.execute(select(*PREFERENCE_COLUMNS).where(Preference.id.in_(pref_ids)))
+        return {str(row.id): preference_to_dict(row) for row in result}
+
+async def get_preference_versions(pref_ids):
+    """Fetch only `updated_at` for several preferences, as {pref_id: updated_at}."""
+    if not pref_ids:
+        return {}
+    async with engine.connect() as conn:
+        result = await conn.execute(select(Preference.id, Preference.updated_at).where(Preference.id.in_(pref_ids)))
+        return {str(pref_id): updated_at for pref_id, updated_at in result}
@@ -1,6 +1,24 @@
+import os
 from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
+def engine_options(database_url):
+    """
+    Connection pool settings for SQLALCHEMY_ENGINE_OPTIONS (and the async
+    engine), read from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_PRE_PING and DB_POOL_RECYCLE.
+    """
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') != '0',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    # SQLite (local runs, benchmarks) does not use a sized QueuePool
+    if not (database_url or '').startswith('sqlite'):
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE', 10))
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+        options['pool_timeout'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    return options
+
 class Preference(db.Model):
     __tablename__ = 'preferences'
     id = db.Column(db.String, primary_key=True)
@@ -23,4 +41,15 @@ class Preference(db.Model):
     desired_feelings = db.Column(db.ARRAY(db.String))
     disliked_genres = db.Column(db.ARRAY(db.String))
     created_at = db.Column(db.DateTime)
-    updated_at = db.Column(db.DateTime)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime)
+
+# Columns the recommender reads (PreferenceEncoder's four feature columns plus
+# id and updated_at); lookups select only these, as plain rows
+PREFERENCE_COLUMNS = (
+    Preference.id,
+    Preference.updated_at,
+    Preference.preferred_language,
+    Preference.favorite_genres,
+    Preference.preferred_book_types,
+    Preference.preferred_formats,
+)
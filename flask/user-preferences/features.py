@@ -0,0 +1,268 @@
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MultiLabelBinarizer
+
+from scoring import make_scorer, normalize_rows
+
+# Language mapping
+language_map = {
+    'indonesian': 'Indonesia',
+    'english': 'Inggris',
+    'other' : 'Other'
+}
+
+# Book type mapping
+book_type_map = {
+    'fiction': 'Fiction',
+    'non-fiction': 'Nonfiction'
+}
+
+# Cover type mapping
+cover_type_map = {
+    'paperback': 'Paperback',
+    'hardcover': 'Hardcover',
+    'ebook': 'Ebook',
+    'audiobook': 'Audiobook'
+}
+
+# Genre mapping
+genre_map = {
+    'arts_architecture': 'Arts & Architecture',
+    'business': 'Business',
+    "children_book": "Children's Books",
+    'chinese_literature': 'Chinese Literature',
+    'climate_change': 'Climate Change',
+    'colonialism': 'Colonialism',
+    'crc_fict': 'Colonialism, Race, Class (Fict.)',
+    'crime_mystery': "Crime & Mystery",
+    'critiques_capitalism': 'Critiques on Capitalism',
+    'dystopian_postapocalyptic': 'Dystopian & Post-Apocalyptic',
+    'education': 'Education',
+    'family': 'Family',
+    'fantasy_scifi': 'Fantasy & Sci-Fi',
+    'feminism': 'Feminism',
+    'graphic_novels': 'Graphic Novels',
+    'historical_fiction': 'Historical Fiction',
+    'history': 'History',
+    'indonesian_literature': 'Indonesian Literature',
+    'japanese_literature': 'Japanese Literature',
+    'korean_literature': 'Korean Literature',
+    'literacy_criticalism': 'Literacy Criticalism',
+    'magazine_zine': 'Magazine & Zine',
+    'memoirs_biography': 'Memoirs & Biography',
+    'natural_science': 'Natural Science',
+    'on_womanhood': 'On Womanhood',
+    'other_people': "Other People's Book",
+    'pets': 'Pets!',
+    'philosophy': 'Philosophy',
+    'poetry_literacy': 'Poetry & Literacy Criticism',
+    'politics_sociology': 'Politics & Sociology',
+    'psychology_selfhelp': 'Psychology & Self Help',
+    'religions': 'Religions',
+    'romance': 'Romance',
+    'russian_literature': 'Russian Literature',
+    'science': 'Science',
+    'self_discovery': 'Self Discovery',
+    'self_help': 'Self Help',
+    'travel': 'Travel',
+    'western_classic_lit': 'Western Classic Lit.',
+    'western_classics': 'Western Classics',
+    'western_contemporary': 'Western Contemporary Lit.',
+    'world_literature': 'World Literature'
+}
+
+# Raw preference field -> (feature prefix, value mapping, fallback for unmapped values)
+MULTI_VALUE_FIELDS = [
+    ('favorite_genres', 'genre', genre_map, lambda value: value.replace('_', ' ').title()),
+    ('preferred_formats', 'cover_type', cover_type_map, str.title),
+    ('preferred_book_types', 'content_type', book_type_map, str.title),
+]
+
+
+class PreferenceEncoder:
+    """
+    Encode a raw preferences dict (as returned by get_user_preferences_from_db)
+    straight into a row of the book feature space.
+
+    The result matches the MultiLabelBinarizer/get_dummies pipeline used to
+    build the model: a feature is set only if the CSV users produced that
+    column, and every known raw value is resolved to its column index once,
+    up front.
+    """
+
+    def __init__(self, feature_columns, user_feature_columns):
+        self.feature_columns = list(feature_columns)
+        self.width = len(self.feature_columns)
+        user_columns = set(user_feature_columns)
+        self.column_index = {
+            col: i for i, col in enumerate(self.feature_columns) if col in user_columns
+        }
+
+        self._lookups = {}
+        for source, prefix, mapping, fallback in MULTI_VALUE_FIELDS:
+            self._lookups[source] = {
+                raw: self.column_index.get(f'{prefix}_{value}') for raw, value in mapping.items()
+            }
+        self._lookups['preferred_language'] = {
+            raw: self.column_index.get(f'language_{value}') for raw, value in language_map.items()
+        }
+
+    def feature_indices(self, prefs):
+        """Return the column indices set to 1 for this user."""
+        indices = []
+        for source, prefix, mapping, fallback in MULTI_VALUE_FIELDS:
+            values = prefs.get(source)
+            if not isinstance(values, list):
+                continue
+            lookup = self._lookups[source]
+            for raw in values:
+                raw = raw.strip()
+                if raw in lookup:
+                    col = lookup[raw]
+                else:
+                    col = self.column_index.get(f'{prefix}_{fallback(raw)}')
+                if col is not None:
+                    indices.append(col)
+
+        language = prefs.get('preferred_language')
+        if isinstance(language, str):
+            lookup = self._lookups['preferred_language']
+            col = lookup[language] if language in lookup else self.column_index.get(f'language_{language}')
+            if col is not None:
+                indices.append(col)
+        return indices
+
+    def encode(self, prefs, dtype=np.float64):
+        """Encode one preferences dict into a (width,) vector."""
+        vector = np.zeros(self.width, dtype=dtype)
+        vector[self.feature_indices(prefs)] = 1
+        return vector
+
+    def encode_many(self, prefs_list, dtype=np.float64):
+        """Encode several preferences dicts into an (n, width) matrix."""
+        matrix = np.zeros((len(prefs_list), self.width), dtype=dtype)
+        for row, prefs in enumerate(prefs_list):
+            matrix[row, self.feature_indices(prefs)] = 1
+        return matrix
+
+
+MLB_FIELDS = ['genre', 'cover_type', 'content_type']
+BOOK_CATEGORICAL_COLUMNS = ['language', 'cover_type', 'content_type', 'genre']
+
+
+def split_genres(value):
+    """'{A,B}' style genre string -> ['A', 'B']; anything else -> []."""
+    if not isinstance(value, str):
+        return []
+    return [g.strip() for g in value.strip('{}').split(',') if g.strip()]
+
+
+class FeaturePipeline:
+    """
+    The MultiLabelBinarizer/get_dummies feature pipeline, run once over the
+    user and book DataFrames. Serving (model.build_model) and every
+    evaluation take their matrices from here, so they always agree on the
+    feature space and a parameter sweep never rebuilds features.
+    """
+
+    def __init__(self, user_df, books_df):
+        self.books_df = books_df  # As loaded, for the catalog (model.build_model)
+        user_df = user_df.copy()
+        books_df = books_df.copy()
+
+        # Labels used to judge relevance in the evaluation, before encoding
+        self.book_titles = books_df['book_title'].to_numpy(dtype=object)
+        self.book_genres = [split_genres(genre) for genre in books_df['genre']]
+        languages = books_df['language'].astype(object)
+        self.book_languages = languages.map(language_map).fillna(languages).tolist()
+
+        # Convert {...} string fields to Python sets/lists
+        for field in ['favorite_genres', 'preferred_formats', 'preferred_book_types', 'desired_feelings', 'disliked_genres']:
+            user_df[field] = user_df[field].str.strip('{}').str.split(',')
+
+        user_df['language'] = user_df['preferred_language'].map(language_map).fillna(user_df['preferred_language'])
+        user_df['content_type'] = user_df['preferred_book_types'].apply(
+            lambda x: [book_type_map.get(i.strip(), i.strip().title()) for i in x] if isinstance(x, list) and x != [''] else []
+        )
+        user_df['cover_type'] = user_df['preferred_formats'].apply(
+            lambda x: [cover_type_map.get(i.strip(), i.strip().title()) for i in x] if isinstance(x, list) and x != [''] else []
+        )
+        user_df['genre'] = user_df['favorite_genres'].apply(
+            lambda x: [genre_map.get(i.strip(), i.strip().replace('_', ' ').title()) for i in x] if isinstance(x, list) and x != [''] else []
+        )
+
+        user_df.drop(columns=['preferred_language', 'preferred_book_types', 'preferred_formats', 'favorite_genres'], inplace=True)
+
+        self.user_genres = [[g.strip() for g in genres if g.strip()] for genres in user_df['genre']]
+        self.user_languages = user_df['language'].tolist()
+
+        for field in MLB_FIELDS:
+            user_df[field] = user_df[field].apply(lambda x: [] if x == [''] else x)
+
+        self.mlb_fields = {}
+        for field in MLB_FIELDS:
+            user_df[field] = user_df[field].apply(lambda x: [] if not isinstance(x, list) else x)
+            mlb = MultiLabelBinarizer()
+            transformed = mlb.fit_transform(user_df[field])
+            mlb_df = pd.DataFrame(transformed, columns=[f'{field}_{cls}' for cls in mlb.classes_])
+            mlb_df.index = user_df.index
+            user_df = pd.concat([user_df, mlb_df], axis=1)
+            self.mlb_fields[field] = mlb
+
+        user_df = pd.get_dummies(user_df, columns=['language'])
+
+        user_features_df = user_df.drop(columns=[
+            'genre', 'age_group', 'education_level', 'cover_type', 'content_type', 'city',
+            'reading_frequency', 'reading_time_availability', 'reader_type', 'reading_habits',
+            'desired_feelings', 'disliked_genres'
+        ])
+        self.user_feature_columns = list(user_features_df.columns)
+
+        # --- Book Data Preprocessing ---
+        one_hot_encoded = pd.get_dummies(books_df[BOOK_CATEGORICAL_COLUMNS], prefix=BOOK_CATEGORICAL_COLUMNS)
+        book_features_df = pd.concat([books_df[['id', 'book_title']], one_hot_encoded], axis=1)
+
+        books_df = book_features_df.copy().reset_index(drop=True)
+        users_df = user_features_df.copy().reset_index(drop=True)
+
+        books_features = books_df.drop(columns=['id', 'book_title'], errors='ignore')
+        users_features = users_df.drop(columns=['id'], errors='ignore')
+
+        self.feature_columns = sorted(set(books_features.columns).union(set(users_features.columns)))
+        self.books_vector = self._aligned(books_features, books_df['id'])
+        self.users_vector = self._aligned(users_features, users_df['id'])
+        self.book_ids = self.books_vector.index.to_numpy(dtype=object)
+        self.user_ids = self.users_vector.index.to_numpy(dtype=object)
+        self._normalized = {}
+        self._scorers = {}
+
+    def _aligned(self, features, ids):
+        vector = features.reindex(columns=self.feature_columns, fill_value=0)
+        vector['id'] = ids.values
+        vector.set_index('id', inplace=True)
+        return vector.astype(float)
+
+    def book_matrix(self, dtype=np.float32):
+        """L2-normalized book feature matrix, computed once per dtype."""
+        return self._normalized_matrix('books', self.books_vector, dtype)
+
+    def user_matrix(self, dtype=np.float32):
+        """L2-normalized matrix of the CSV users in the same feature space, computed once per dtype."""
+        return self._normalized_matrix('users', self.users_vector, dtype)
+
+    def book_scorer(self, engine, dtype=np.float64):
+        """Cosine scorer over the books for `engine` (see scoring.make_scorer), built once per engine and dtype."""
+        key = (engine, np.dtype(dtype))
+        if key not in self._scorers:
+            self._scorers[key] = make_scorer(
+                engine, self.books_vector.to_numpy(dtype=float),
+                self.book_matrix(dtype) if engine == 'dense' else None, dtype=dtype
+            )
+        return self._scorers[key]
+
+    def _normalized_matrix(self, name, vector, dtype):
+        key = (name, np.dtype(dtype))
+        if key not in self._normalized:
+            self._normalized[key] = normalize_rows(vector.to_numpy(dtype=float), dtype=dtype)
+        return self._normalized[key]
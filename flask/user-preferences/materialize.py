@@ -0,0 +1,116 @@
+"""
+Offline job: precompute the top-N recommendations of every Preference row
+for the current model artifact, sharded across a process pool, into
+artifacts/recommendations.sqlite. The endpoints serve from that table and
+score live only for preferences that are missing from it, changed since
+(updated_at differs) or asked with a larger top_n:
+
+    python model.py            # the table is tied to an artifact version
+    python materialize.py --top-n 20 --workers 4
+
+Rerun it after every new artifact; a table written for another version is
+ignored.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()  # Loads from .env by default
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='[%(levelname)s] %(name)s: %(message)s')
+
+from sqlalchemy import create_engine, select
+from db import PREFERENCE_COLUMNS, engine_options
+from recommendation import model_slot, preference_stamp, preference_to_dict
+from scoring import top_n_indices_rows
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.topn_store import write_store
+
+MATERIALIZED_TOP_N = 20  # Longest list stored; requests up to this top_n are served from the table
+PREFERENCES_PER_TASK = 512  # Preferences per task sent to a worker
+PENDING_TASKS_PER_WORKER = 2  # Tasks submitted ahead per worker; bounds the chunks held in memory
+
+logger = logging.getLogger(__name__)
+
+_state = {}  # Model in each worker, set by _init_worker
+
+
+def _init_worker(version):
+    # Forked workers share the parent's model; others load the same artifact on import
+    model = model_slot.get()
+    if model.version != version:
+        raise RuntimeError(f"Worker loaded model {model.version}, expected {version}")
+    _state['model'] = model
+
+
+def _score_chunk(chunk, top_n):
+    """Top-N book_matrix rows for a chunk of (pref_id, stamp, prefs), as (pref_id, stamp, rows)."""
+    model = _state['model']
+    user_rows = model.preference_encoder.encode_many([prefs for _, _, prefs in chunk])
+    top_rows = top_n_indices_rows(model.scorer.scores(user_rows), top_n)
+    return [(pref_id, stamp, rows) for (pref_id, stamp, _), rows in zip(chunk, top_rows)]
+
+
+def preference_chunks(database_url, size=PREFERENCES_PER_TASK):
+    """Stream every Preference row from the database in chunks of (pref_id, stamp, prefs)."""
+    engine = create_engine(database_url, **engine_options(database_url))
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=size).execute(select(*PREFERENCE_COLUMNS))
+            for rows in result.partitions():
+                yield [(str(row.id), preference_stamp(row.updated_at), preference_to_dict(row)) for row in rows]
+    finally:
+        engine.dispose()
+
+
+def _scored_rows(pool, chunks, top_n, max_pending):
+    """
+    Score `chunks` on `pool` and yield their rows in chunk order. At most
+    `max_pending` chunks are submitted ahead of the one being written, so
+    neither the preferences read nor the scored rows pile up in memory.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(_score_chunk, chunk, top_n))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def materialize(database_url, top_n=MATERIALIZED_TOP_N, workers=None):
+    """Write the table for the current model artifact; returns the number of preferences stored."""
+    model = model_slot.get()
+    if model.version is None:
+        raise SystemExit("No model artifact to materialize for; run `python model.py` first.")
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model.version,)) as pool:
+        chunks = preference_chunks(database_url)
+        rows = _scored_rows(pool, chunks, top_n, max_pending=workers * PENDING_TASKS_PER_WORKER)
+        return write_store(
+            model.materialized.path, rows, model.version, np.int32,
+            metadata={'model': 'user-preferences', 'top_n': top_n}
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-N recommendations for every preference")
+    parser.add_argument('--top-n', type=int, default=MATERIALIZED_TOP_N)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = materialize(os.getenv('DATABASE_URL'), top_n=args.top_n, workers=args.workers)
+    logger.info("Materialized %d preferences in %.2fs", count, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
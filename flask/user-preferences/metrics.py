@@ -0,0 +1,104 @@
+import numpy as np
+
+from scoring import top_n_indices_rows
+
+EVAL_CHUNK_SIZE = 512  # Users per score-matrix block; keeps the block cache-sized and memory bounded
+
+
+def label_bits(label_lists, vocabulary):
+    """
+    Pack each row's labels (e.g. genres) into uint64 words: bit j is set when
+    vocabulary[j] is present. Labels outside the vocabulary are ignored.
+    """
+    index = {label: i for i, label in enumerate(vocabulary)}
+    bits = np.zeros((len(label_lists), max(1, -(-len(vocabulary) // 64))), dtype=np.uint64)
+    rows, cols = [], []
+    for row, labels in enumerate(label_lists):
+        for label in labels:
+            col = index.get(label)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+    cols = np.asarray(cols, dtype=np.uint64)
+    np.bitwise_or.at(bits, (np.asarray(rows, dtype=np.intp), (cols // 64).astype(np.intp)), np.uint64(1) << (cols % 64))
+    return bits
+
+
+def intersects(a_bits, b_bits):
+    """True where two packed label rows share at least one label; broadcasts over leading axes."""
+    return (a_bits & b_bits).any(axis=-1)
+
+
+def relevant_counts(user_bits, book_bits):
+    """
+    For each user, the number of books sharing at least one label with them.
+    Books and users are grouped by distinct bit pattern first, so the work is
+    distinct-user-patterns × distinct-book-patterns rather than users × books.
+    """
+    book_patterns, book_counts = np.unique(book_bits, axis=0, return_counts=True)
+    user_patterns, inverse = np.unique(user_bits, axis=0, return_inverse=True)
+    totals = intersects(user_patterns[:, None, :], book_patterns[None, :, :]) @ book_counts
+    return totals[inverse.ravel()]
+
+
+def top_k_hits(user_rows, scorer, user_bits, book_bits, k, chunk_size=EVAL_CHUNK_SIZE):
+    """
+    Top-k books per user from the user×book score matrix (one `scorer.scores`
+    call per block of raw user rows; see scoring.make_scorer), plus whether
+    each recommended book is relevant.
+    Returns (indices, scores, hits), each of shape (users, k), best first.
+    """
+    n_users = user_rows.shape[0]
+    k = min(k, len(scorer))
+    indices = np.empty((n_users, k), dtype=np.intp)
+    scores = np.empty((n_users, k), dtype=scorer.dtype)
+    hits = np.empty((n_users, k), dtype=bool)
+    for start in range(0, n_users, chunk_size):
+        stop = min(start + chunk_size, n_users)
+        block = scorer.scores(user_rows[start:stop])
+        top = top_n_indices_rows(block, k)
+        indices[start:stop] = top
+        scores[start:stop] = np.take_along_axis(block, top, axis=1)
+        hits[start:stop] = intersects(user_bits[start:stop, None, :], book_bits[top])
+    return indices, scores, hits
+
+
+def precision_recall(found, relevant_totals, k):
+    """Precision@k and Recall@k from per-user hit counts; recall is 0 when nothing is relevant."""
+    found = np.asarray(found, dtype=float)
+    precision = found / k if k > 0 else np.zeros_like(found)
+    recall = np.divide(found, relevant_totals, out=np.zeros_like(found), where=relevant_totals > 0)
+    return precision, recall
+
+
+def threshold_k_sweep(top_scores, hits, relevant_totals, thresholds, k_values):
+    """
+    Mean Precision@k and Recall@k for every (threshold, k) pair from one
+    sorted top-max(k) result. Only books scoring above the threshold count.
+    Because scores are sorted, those books are a prefix of each row, so the
+    hits for (threshold, k) are the cumulative hit count at
+    min(k, number above threshold). Users with nothing above a threshold are
+    skipped for it. Returns (precision, recall), each of shape
+    (len(thresholds), len(k_values)).
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    k_values = np.asarray(k_values, dtype=np.intp)
+    n_users = hits.shape[0]
+    cumulative = np.zeros((n_users, hits.shape[1] + 1), dtype=np.intp)
+    np.cumsum(hits, axis=1, out=cumulative[:, 1:])
+
+    # (users, thresholds): how many of the sorted top scores clear each threshold
+    passed = (top_scores[:, None, :] > thresholds[None, :, None]).sum(axis=2)
+    taken = np.minimum(passed[:, :, None], k_values[None, None, :])
+    found = np.take_along_axis(cumulative, taken.reshape(n_users, -1), axis=1).reshape(taken.shape)
+
+    evaluated = (passed > 0)[:, :, None]
+    counts = evaluated.sum(axis=0)
+    precision = np.where(evaluated, found / k_values, 0).sum(axis=0)
+    recall = np.where(evaluated, np.divide(
+        found, relevant_totals[:, None, None], out=np.zeros(found.shape), where=relevant_totals[:, None, None] > 0
+    ), 0).sum(axis=0)
+    return (
+        np.divide(precision, counts, out=np.zeros(precision.shape), where=counts > 0),
+        np.divide(recall, counts, out=np.zeros(recall.shape), where=counts > 0),
+    )
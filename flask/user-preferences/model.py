@@ -0,0 +1,200 @@
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MultiLabelBinarizer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.artifact import latest_version, load_artifact, save_artifact
+from common.book_store import BookStore
+from common.catalog import read_catalog
+from common.topn_store import TopNStore
+from features import BOOK_CATEGORICAL_COLUMNS, MLB_FIELDS, FeaturePipeline, PreferenceEncoder
+from scoring import SCORING_ENGINE, make_scorer
+
+ARTIFACT_DIR = "artifacts"
+MODEL_SCHEMA = 2
+MATERIALIZED_FILE = "recommendations.sqlite"  # Written by materialize.py, next to the artifact versions
+CATALOG_COLUMNS = ['id', 'book_title', 'author', 'genre']
+# Only what the features and the enrichment catalog use, out of the 19 CSV columns
+BOOK_COLUMNS = ['id', 'book_title', 'author', 'language', 'cover_type', 'content_type', 'genre']
+BOOK_DTYPES = {'id': 'str', 'book_title': 'str', 'author': 'str'}
+
+logger = logging.getLogger(__name__)
+
+# --- Data Loading and Preprocessing ---
+
+def load_user_data():
+    try:
+        user_df = pd.read_csv("data/user_preferences.csv", sep=';', on_bad_lines='warn', encoding="latin-1")
+    except UnicodeDecodeError:
+        user_df = pd.read_csv("data/user_preferences.csv", sep=';', on_bad_lines='warn', encoding="ISO-8859-1")
+    return user_df
+
+def load_books_data():
+    """
+    Read the books CSV once, for both the features and the catalog: pruned
+    to BOOK_COLUMNS, typed, with the one-hot columns as categoricals.
+    Undecodable bytes are replaced instead of re-reading with another
+    encoding. Cached as Arrow when pyarrow is installed (see common.catalog).
+    """
+    books_df = read_catalog(
+        "data/books_dataset.csv", BOOK_COLUMNS, dtypes=BOOK_DTYPES, categorical=BOOK_CATEGORICAL_COLUMNS,
+        sep=';', on_bad_lines='warn', encoding='utf-8', encoding_errors='replace'
+    )
+    books_df['id'] = books_df['id'].str.strip()  # Ensure IDs are clean
+    return books_df
+
+def load_catalog(books_df=None):
+    # The enrichment columns, taken from an already loaded books frame when given
+    books_df = load_books_data() if books_df is None else books_df
+    return books_df[CATALOG_COLUMNS]
+
+# --- Model Building ---
+
+def build_pipeline(books_df=None):
+    """Run the shared feature pipeline over the CSV users and books."""
+    return FeaturePipeline(load_user_data(), load_books_data() if books_df is None else books_df)
+
+def build_model(pipeline=None):
+    """
+    Return the pieces the recommender needs from the feature pipeline: the
+    fitted MultiLabelBinarizers, the user feature columns, the book feature
+    matrix (raw and L2-normalized float32) and the catalog used for
+    enrichment. The books CSV is read once for both features and catalog;
+    a given `pipeline` supplies the books it was built from.
+    """
+    pipeline = pipeline or build_pipeline()
+    logger.debug("books_vector shape: %s", pipeline.books_vector.shape)
+
+    return {
+        'mlb_fields': pipeline.mlb_fields,
+        'user_feature_columns': pipeline.user_feature_columns,
+        'books_vector': pipeline.books_vector,
+        'book_matrix': pipeline.book_matrix(np.float32),
+        'book_ids': pipeline.book_ids,
+        'catalog': load_catalog(pipeline.books_df),
+    }
+
+# --- Artifact Save / Load ---
+
+def save_model(model, directory=ARTIFACT_DIR):
+    books_vector = model['books_vector']
+    arrays = {
+        'books_vector': books_vector.to_numpy(dtype=float),
+        'books_vector_ids': model['book_ids'],
+        'book_matrix': model['book_matrix'],
+        'books_vector_columns': np.asarray(books_vector.columns, dtype=object),
+        'user_feature_columns': np.asarray(model['user_feature_columns'], dtype=object),
+    }
+    for field, mlb in model['mlb_fields'].items():
+        arrays[f'mlb_{field}_classes'] = np.asarray(mlb.classes_, dtype=object)
+    for col in CATALOG_COLUMNS:
+        arrays[f'catalog_{col}'] = model['catalog'][col].to_numpy(dtype=object)
+
+    metadata = {
+        'model': 'user-preferences',
+        'schema': MODEL_SCHEMA,
+        'books': int(books_vector.shape[0]),
+        'features': int(books_vector.shape[1]),
+    }
+    return save_artifact(directory, arrays, metadata)
+
+def load_model(directory=ARTIFACT_DIR):
+    """Load the newest artifact as a model dict, or return None if there is none."""
+    loaded = load_artifact(directory)
+    if loaded is None:
+        return None
+    arrays, manifest = loaded
+    metadata = manifest['metadata']
+    if metadata.get('model') != 'user-preferences' or metadata.get('schema') != MODEL_SCHEMA:
+        return None
+
+    mlb_fields = {}
+    for field in MLB_FIELDS:
+        mlb = MultiLabelBinarizer(classes=arrays[f'mlb_{field}_classes'].tolist())
+        mlb_fields[field] = mlb.fit([[]])
+
+    books_vector = pd.DataFrame(
+        arrays['books_vector'],
+        index=pd.Index(arrays['books_vector_ids'].tolist(), name='id'),
+        columns=arrays['books_vector_columns'].tolist(),
+        copy=False
+    )
+    # Empty strings in the artifact stand for missing values in the CSV
+    catalog = pd.DataFrame({
+        col: pd.Series(arrays[f'catalog_{col}'], dtype=object).replace('', np.nan) for col in CATALOG_COLUMNS
+    })
+    return {
+        'mlb_fields': mlb_fields,
+        'user_feature_columns': arrays['user_feature_columns'].tolist(),
+        'books_vector': books_vector,
+        'book_matrix': arrays['book_matrix'],
+        'book_ids': arrays['books_vector_ids'],
+        'catalog': catalog,
+    }
+
+# --- Swappable Model ---
+
+class RecommenderModel:
+    """
+    One complete model version: the feature columns, the book scorer, the
+    preference encoder and the enrichment catalog. It is built or loaded off
+    the request path and published through `common.model_slot.ModelSlot`; a
+    request keeps one version throughout.
+
+    The book feature matrices are not kept: the scorer holds the only book
+    side it needs (the normalized float32 matrix for the dense engine, the
+    distinct bit-packed patterns for the packed one).
+    """
+
+    def __init__(self, parts, version=None, directory=ARTIFACT_DIR, scoring_engine=SCORING_ENGINE):
+        self.version = version  # Artifact version, or None when built from CSV
+        self.mlb_fields = parts['mlb_fields']
+        self.user_feature_columns = parts['user_feature_columns']
+        self.feature_columns = parts['books_vector'].columns  # Book feature space, one column per feature
+        self.book_ids = parts['book_ids']
+        self.preference_encoder = PreferenceEncoder(self.feature_columns, self.user_feature_columns)
+        # Cosine of raw user rows against every book (scoring.SCORING_ENGINE: dense or bit-packed)
+        self.scorer = make_scorer(
+            scoring_engine, parts['books_vector'].to_numpy(),
+            parts['book_matrix'] if scoring_engine == 'dense' else None
+        )
+        self.book_store = BookStore(parts['catalog'], key='id')
+        # Catalog code (int32) of each book_matrix row, so enrichment never hashes a UUID
+        self.book_codes = self.book_store.ids.codes([str(book_id).strip() for book_id in self.book_ids])
+        # Top-N lists precomputed by materialize.py for this artifact version (none when built from CSV)
+        self.materialized = TopNStore(os.path.join(directory, MATERIALIZED_FILE), version)
+
+    @classmethod
+    def build(cls, pipeline=None):
+        return cls(build_model(pipeline))
+
+    @classmethod
+    def load(cls, directory=ARTIFACT_DIR):
+        version = latest_version(directory)
+        parts = load_model(directory)
+        return None if parts is None else cls(parts, version=version, directory=directory)
+
+    @classmethod
+    def load_or_build(cls, current=None, directory=ARTIFACT_DIR):
+        """
+        ModelSlot loader: keep `current` if it is already the newest
+        artifact, load a newer artifact if there is one, otherwise rebuild
+        from CSV.
+        """
+        version = latest_version(directory)
+        if current is not None and version is not None and current.version == version:
+            return current
+        model = cls.load(directory)
+        if model is None:
+            logger.info("No model artifact found in '%s', building from CSV.", directory)
+            model = cls.build()
+        return model
+
+if __name__ == '__main__':
+    # Offline build: python model.py
+    path = save_model(build_model())
+    print(f"Model artifact written to {path}")
@@ -1,311 +1,229 @@
-# Load User Preferences CSV
-import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer, OneHotEncoder
-from sklearn.metrics.pairwise import cosine_similarity
-import ast
-from db import Preference
-
-# Load the full book dataset for enrichment
-books_df_full = pd.read_csv('data/books_dataset.csv', delimiter=';')
-books_df_full['id'] = books_df_full['id'].astype(str).str.strip()  # Ensure IDs are clean
-books_df_full.columns = books_df_full.columns.str.strip()  # Remove spaces from column names
-
-# --- Data Loading and Preprocessing ---
-
-def load_user_data():
-    try:
-        user_df = pd.read_csv("data/user_preferences.csv", sep=';', on_bad_lines='warn', encoding="latin-1")
-    except UnicodeDecodeError:
-        user_df = pd.read_csv("data/user_preferences.csv", sep=';', on_bad_lines='warn', encoding="ISO-8859-1")
-    return user_df
-
-def load_books_data():
-    try:
-        books_df = pd.read_csv("data/books_dataset.csv", sep=';', on_bad_lines='warn', encoding="latin-1")
-    except UnicodeDecodeError:
-        books_df = pd.read_csv("data/books_dataset.csv", sep=';', on_bad_lines='warn', encoding="ISO-8859-1")
-    return books_df
-
-user_df = load_user_data()
-books_df = load_books_data()
-
-# Convert {...} string fields to Python sets/lists
-user_df['favorite_genres'] = user_df['favorite_genres'].str.strip('{}').str.split(',')
-user_df['preferred_formats'] = user_df['preferred_formats'].str.strip('{}').str.split(',')
-user_df['preferred_book_types'] = user_df['preferred_book_types'].str.strip('{}').str.split(',')
-user_df['desired_feelings'] = user_df['desired_feelings'].str.strip('{}').str.split(',')
-user_df['disliked_genres'] = user_df['disliked_genres'].str.strip('{}').str.split(',')
-
-# Language mapping
-language_map = {
-    'indonesian': 'Indonesia',
-    'english': 'Inggris',
-    'other' : 'Other'
-}
-user_df['language'] = user_df['preferred_language'].map(language_map).fillna(user_df['preferred_language'])
-
-# Book type mapping
-book_type_map = {
-    'fiction': 'Fiction',
-    'non-fiction': 'Nonfiction'
-}
-user_df['content_type'] = user_df['preferred_book_types'].apply(
-    lambda x: [book_type_map.get(i.strip(), i.strip().title()) for i in x] if isinstance(x, list) and x != [''] else []
-)
-
-# Cover type mapping
-cover_type_map = {
-    'paperback': 'Paperback',
-    'hardcover': 'Hardcover',
-    'ebook': 'Ebook',
-    'audiobook': 'Audiobook'
-}
-user_df['cover_type'] = user_df['preferred_formats'].apply(
-    lambda x: [cover_type_map.get(i.strip(), i.strip().title()) for i in x] if isinstance(x, list) and x != [''] else []
-)
-
-# Genre mapping
-genre_map = {
-    'arts_architecture': 'Arts & Architecture',
-    'business': 'Business',
-    "children_book": "Children's Books",
-    'chinese_literature': 'Chinese Literature',
-    'climate_change': 'Climate Change',
-    'colonialism': 'Colonialism',
-    'crc_fict': 'Colonialism, Race, Class (Fict.)',
-    'crime_mystery': "Crime & Mystery",
-    'critiques_capitalism': 'Critiques on Capitalism',
-    'dystopian_postapocalyptic': 'Dystopian & Post-Apocalyptic',
-    'education': 'Education',
-    'family': 'Family',
-    'fantasy_scifi': 'Fantasy & Sci-Fi',
-    'feminism': 'Feminism',
-    'graphic_novels': 'Graphic Novels',
-    'historical_fiction': 'Historical Fiction',
-    'history': 'History',
-    'indonesian_literature': 'Indonesian Literature',
-    'japanese_literature': 'Japanese Literature',
-    'korean_literature': 'Korean Literature',
-    'literacy_criticalism': 'Literacy Criticalism',
-    'magazine_zine': 'Magazine & Zine',
-    'memoirs_biography': 'Memoirs & Biography',
-    'natural_science': 'Natural Science',
-    'on_womanhood': 'On Womanhood',
-    'other_people': "Other People's Book",
-    'pets': 'Pets!',
-    'philosophy': 'Philosophy',
-    'poetry_literacy': 'Poetry & Literacy Criticism',
-    'politics_sociology': 'Politics & Sociology',
-    'psychology_selfhelp': 'Psychology & Self Help',
-    'religions': 'Religions',
-    'romance': 'Romance',
-    'russian_literature': 'Russian Literature',
-    'science': 'Science',
-    'self_discovery': 'Self Discovery',
-    'self_help': 'Self Help',
-    'travel': 'Travel',
-    'western_classic_lit': 'Western Classic Lit.',
-    'western_classics': 'Western Classics',
-    'western_contemporary': 'Western Contemporary Lit.',
-    'world_literature': 'World Literature'
-}
-user_df['genre'] = user_df['favorite_genres'].apply(
-    lambda x: [genre_map.get(i.strip(), i.strip().replace('_', ' ').title()) for i in x] if isinstance(x, list) and x != [''] else []
-)
-
-user_df.drop(columns=['preferred_language', 'preferred_book_types', 'preferred_formats', 'favorite_genres'], inplace=True)
-
-fields = ['genre', 'cover_type', 'content_type']
-for field in fields:
-    user_df[field] = user_df[field].apply(lambda x: [] if x == [''] else x)
-
-mlb_fields = {}
-for field in fields:
-    user_df[field] = user_df[field].apply(lambda x: [] if not isinstance(x, list) else x)
-    mlb = MultiLabelBinarizer()
-    transformed = mlb.fit_transform(user_df[field])
-    mlb_df = pd.DataFrame(transformed, columns=[f'{field}_{cls}' for cls in mlb.classes_])
-    mlb_df.index = user_df.index
-    user_df = pd.concat([user_df, mlb_df], axis=1)
-    mlb_fields[field] = mlb
-
-user_df = pd.get_dummies(user_df, columns=['language'])
-
-user_features_df = user_df.drop(columns=[
-    'genre', 'age_group', 'education_level', 'cover_type', 'content_type', 'city',
-    'reading_frequency', 'reading_time_availability', 'reader_type', 'reading_habits',
-    'desired_feelings', 'disliked_genres'
-])
-
-# --- Book Data Preprocessing ---
-def safe_parse_themes(x):
-    if isinstance(x, str):
-        try:
-            return ast.literal_eval(x)
-        except Exception:
-            return []
-    return []
-books_df['themes'] = books_df['themes'].apply(safe_parse_themes)
-
-categorical_cols = ['language', 'cover_type', 'content_type', 'genre']
-one_hot_encoded = pd.get_dummies(books_df[categorical_cols], prefix=categorical_cols)
-
-book_features_df = pd.concat([books_df[['id', 'book_title']], one_hot_encoded], axis=1)
-
-books_df = book_features_df.copy().reset_index(drop=True)
-users_df = user_features_df.copy().reset_index(drop=True)
-
-book_ids = books_df['id'].values
-user_ids = users_df['id'].values
-
-books_features = books_df.drop(columns=['id', 'book_title'], errors='ignore')
-users_features = users_df.drop(columns=['id'], errors='ignore')
-
-all_feature_columns = sorted(set(books_features.columns).union(set(users_features.columns)))
-books_aligned = books_features.reindex(columns=all_feature_columns, fill_value=0)
-users_aligned = users_features.reindex(columns=all_feature_columns, fill_value=0)
-
-books_vector = books_aligned.copy()
-books_vector['id'] = book_ids
-users_vector = users_aligned.copy()
-users_vector['id'] = user_ids
-
-books_vector.set_index('id', inplace=True)
-users_vector.set_index('id', inplace=True)
-
-users_vector = users_vector.astype(float)
-books_vector = books_vector.astype(float)
-
-book_titles = books_df.set_index('id')['book_title'].to_dict()
-
-# --- Similarity Calculation ---
-book_feature_columns = [col for col in books_vector.columns if col != 'id']
-
-user_vector = (
-    user_features_df
-    .drop(columns=['id'], errors='ignore')
-    .reindex(columns=book_feature_columns, fill_value=0)
-    .values.astype(float)
+import logging
+import os
+import sys
+from sqlalchemy import bindparam, select
+from db import PREFERENCE_COLUMNS, Preference, db
+from model import RecommenderModel
+from scoring import top_n_indices
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.cache import TTLCache
+from common.model_slot import ModelSlot
+from common.prometheus import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BATCH_CHUNK_SIZE = 256  # Users scored per matrix-matrix product
+RESULT_CACHE_SIZE = 10000  # Preference ids kept in the result cache (LRU)
+RESULT_CACHE_TTL = 3600  # Seconds before a cached result is recomputed regardless
+MAX_BATCH_IDS = 50  # Preference ids accepted per batch request
+# With the check on, a cache hit costs one updated_at lookup. Turn it off
+# (RESULT_CACHE_CHECK_UPDATED_AT=0) when every preference save calls the
+# invalidation endpoint, and hits skip the database entirely.
+RESULT_CACHE_CHECK_UPDATED_AT = os.getenv('RESULT_CACHE_CHECK_UPDATED_AT', '1') != '0'
+
+result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)  # pref_id -> (updated_at, {top_n: books})
+
+# --- Model Loading (artifact from `python model.py`, or built from CSV) ---
+# The live model sits in a ModelSlot: each request calls `model_slot.get()`
+# once, and a background rebuild (`model_slot.start` / `reload_in_background`)
+# swaps a new version in atomically. Cached results are dropped on every swap.
+model_slot = ModelSlot(RecommenderModel.load_or_build, on_swap=lambda old, new: result_cache.clear())
+
+# Seconds spent per stage (db_fetch, materialized, encode, score, top_n, enrich), served on /metrics
+stage_seconds = REGISTRY.histogram(
+    'recommendation_stage_seconds', 'Time spent in each recommendation stage.', labelnames=('stage',)
 )
-book_vectors = books_vector.drop(columns=['id'], errors='ignore').values.astype(float)
 
-similarity_matrix = cosine_similarity(users_vector.values, books_vector.values)
+logger.info("Model: %d books x %d features", len(model_slot.get().scorer), len(model_slot.get().feature_columns))
 
-similarity_df = pd.DataFrame(
-    similarity_matrix,
-    index=users_vector.index,
-    columns=books_vector.index
+# Column-only statements, built once so SQLAlchemy reuses the compiled SQL.
+# Rows come back as plain tuples instead of ORM objects.
+preference_by_id = select(*PREFERENCE_COLUMNS).where(Preference.id == bindparam('pref_id'))
+preferences_by_ids = select(*PREFERENCE_COLUMNS).where(Preference.id.in_(bindparam('pref_ids', expanding=True)))
+preference_versions_by_ids = select(Preference.id, Preference.updated_at).where(
+    Preference.id.in_(bindparam('pref_ids', expanding=True))
 )
 
-print("\nusers_vector shape:", users_vector.shape)
-print("books_vector shape:", books_vector.shape)
-print("similarity_matrix shape:", similarity_df.shape, "\n")
+def read_top_n(value):
+    # top_n must be an integer >= 1 ("abc", 2.5, 0 and -3 are rejected); None when invalid
+    try:
+        top_n = int(str(value).strip())
+    except ValueError:
+        return None
+    return top_n if top_n >= 1 else None
 
 def get_recommendations_for_user(pref_id, top_n=5):
-    print(f"\n[LOG] Received pref_id: {pref_id}\n")
-    user_prefs = get_user_preferences_from_db(pref_id)
+    logger.debug("Received pref_id: %s", pref_id)
+    model = model_slot.get()
+    with stage_seconds.time('db_fetch'):
+        versions = get_preference_versions_from_db([pref_id]) if RESULT_CACHE_CHECK_UPDATED_AT else {}
+    if RESULT_CACHE_CHECK_UPDATED_AT and pref_id not in versions:
+        logger.debug("No user found for id: %s", pref_id)
+        return []
+    cached = _cached_result(pref_id, top_n, versions)
+    if cached is None:
+        cached = materialized_results(model, [pref_id], top_n, versions).get(pref_id)
+    if cached is not None:
+        logger.debug("Cached recommendations for id: %s", pref_id)
+        return cached
+
+    with stage_seconds.time('db_fetch'):
+        user_prefs = get_user_preferences_from_db(pref_id)
     if not user_prefs:
-        print(f"[LOG] No user found for id: {pref_id}\n")
+        logger.debug("No user found for id: %s", pref_id)
         return []
 
-    print(f"[LOG] Raw user_prefs from DB: {user_prefs}")
-
-    # Transform DB user_prefs dict to a DataFrame row matching user_df columns
-    # Fill missing fields with empty string or empty list as appropriate
-    user_row = {
-        'id': str(user_prefs.get('id', '')),
-        'age_group': user_prefs.get('age_group', ''),
-        'education_level': user_prefs.get('education_level', ''),
-        'city': user_prefs.get('city', ''),
-        'preferred_language': user_prefs.get('preferred_language', ''),
-        'reading_frequency': user_prefs.get('reading_frequency', ''),
-        'reading_time_availability': user_prefs.get('reading_time_availability', ''),
-        'reader_type': user_prefs.get('reader_type', ''),
-        'reading_habits': user_prefs.get('reading_habits', ''),
-        'favorite_genres': user_prefs.get('favorite_genres', []),
-        'preferred_book_types': user_prefs.get('preferred_book_types', []),
-        'preferred_formats': user_prefs.get('preferred_formats', []),
-        'desired_feelings': user_prefs.get('desired_feelings', []),
-        'disliked_genres': user_prefs.get('disliked_genres', []),
-    }
-    print(f"[LOG] user_row before DataFrame: {user_row}\n")
-
-    # Create a DataFrame for this user
-    user_df_db = pd.DataFrame([user_row])
-
-    # Apply the same preprocessing as for the CSV
-    user_df_db['favorite_genres'] = user_df_db['favorite_genres'].apply(lambda x: [i.strip() for i in x] if isinstance(x, list) else [])
-    user_df_db['preferred_formats'] = user_df_db['preferred_formats'].apply(lambda x: [i.strip() for i in x] if isinstance(x, list) else [])
-    user_df_db['preferred_book_types'] = user_df_db['preferred_book_types'].apply(lambda x: [i.strip() for i in x] if isinstance(x, list) else [])
-    user_df_db['desired_feelings'] = user_df_db['desired_feelings'].apply(lambda x: [i.strip() for i in x] if isinstance(x, list) else [])
-    user_df_db['disliked_genres'] = user_df_db['disliked_genres'].apply(lambda x: [i.strip() for i in x] if isinstance(x, list) else [])
-
-    # Language mapping
-    user_df_db['language'] = user_df_db['preferred_language'].map(language_map).fillna(user_df_db['preferred_language'])
-
-    # Book type mapping
-    user_df_db['content_type'] = user_df_db['preferred_book_types'].apply(
-        lambda x: [book_type_map.get(i.strip(), i.strip().title()) for i in x] if isinstance(x, list) and x != [''] else []
-    )
-
-    # Cover type mapping
-    user_df_db['cover_type'] = user_df_db['preferred_formats'].apply(
-        lambda x: [cover_type_map.get(i.strip(), i.strip().title()) for i in x] if isinstance(x, list) and x != [''] else []
-    )
-
-    # Genre mapping
-    user_df_db['genre'] = user_df_db['favorite_genres'].apply(
-        lambda x: [genre_map.get(i.strip(), i.strip().replace('_', ' ').title()) for i in x] if isinstance(x, list) and x != [''] else []
-    )
+    logger.debug("Raw user_prefs from DB: %s", user_prefs)
+
+    # Encode preferences straight into the book feature space
+    with stage_seconds.time('encode'):
+        user_vector = model.preference_encoder.encode(user_prefs)
+    with stage_seconds.time('score'):
+        sim_scores = model.scorer.score(user_vector)
+    with stage_seconds.time('top_n'):
+        top_indices = top_n_indices(sim_scores, top_n)
+        top_book_ids = model.book_ids[top_indices]
+
+    with stage_seconds.time('enrich'):
+        recommended_books = enrich_books(top_book_ids, model.book_store, model.book_codes[top_indices])
+    logger.debug("Final Recommendations: %s", recommended_books)
+    _store_result(pref_id, top_n, versions.get(pref_id), recommended_books, model)
+    return recommended_books
 
-    # Drop columns to match the original pipeline
-    user_df_db.drop(columns=['preferred_language', 'preferred_book_types', 'preferred_formats', 'favorite_genres'], inplace=True)
-
-    # Ensure all fields are lists
-    for field in ['genre', 'cover_type', 'content_type']:
-        user_df_db[field] = user_df_db[field].apply(lambda x: [] if x == [''] else x)
-
-    # MultiLabelBinarizer for new user (use the same mlb_fields as the CSV)
-    for field in ['genre', 'cover_type', 'content_type']:
-        user_df_db[field] = user_df_db[field].apply(lambda x: [] if not isinstance(x, list) else x)
-        mlb = mlb_fields[field]
-        transformed = mlb.transform(user_df_db[field])
-        mlb_df = pd.DataFrame(transformed, columns=[f'{field}_{cls}' for cls in mlb.classes_])
-        user_df_db = pd.concat([user_df_db, mlb_df], axis=1)
-
-    # One-hot encode language (ensure all columns exist)
-    user_df_db = pd.get_dummies(user_df_db, columns=['language'])
-    for col in [c for c in user_features_df.columns if c.startswith('language_')]:
-        if col not in user_df_db.columns:
-            user_df_db[col] = 0
-
-    # Align columns with user_features_df
-    user_features_db = user_df_db.reindex(columns=user_features_df.columns, fill_value=0)
-    print(f"[LOG] user_features_db columns: {user_features_db.columns.tolist()}\n")
-
-    # Drop 'id' from both, and reindex user to match book columns
-    book_feature_columns = [col for col in books_vector.columns if col != 'id']
-
-    user_vector = (
-        user_features_db
-        .drop(columns=['id'], errors='ignore')
-        .reindex(columns=book_feature_columns, fill_value=0)
-        .values.astype(float)
+def get_recommendations_for_users(pref_ids, top_n=5):
+    """
+    Recommendations for many preference ids at once: one DB query, one
+    encoded user matrix and one matrix-matrix product per chunk of users.
+    Returns {pref_id: [books]}; unknown ids map to [].
+    """
+    pref_ids = list(dict.fromkeys(str(pref_id) for pref_id in pref_ids))
+    with stage_seconds.time('db_fetch'):
+        versions = get_preference_versions_from_db(pref_ids) if RESULT_CACHE_CHECK_UPDATED_AT else {}
+    results, missing = lookup_cached_results(pref_ids, top_n, versions)
+
+    with stage_seconds.time('db_fetch'):
+        prefs_by_id = get_many_user_preferences_from_db(missing)
+    logger.debug(
+        "Batch of %d pref_ids, %d cached, %d loaded from DB",
+        len(pref_ids), len(pref_ids) - len(missing), len(prefs_by_id)
     )
-    book_vectors = books_vector.drop(columns=['id'], errors='ignore').values.astype(float)
-    print("user_vector shape:", user_vector.shape)
-    print("book_vectors shape:", book_vectors.shape)
-    print("book_feature_columns:", book_feature_columns)
-    sim_scores = cosine_similarity(user_vector, book_vectors)[0]
-    top_indices = sim_scores.argsort()[::-1][:top_n]
-    top_book_ids = books_vector.index[top_indices]
 
+    results.update(recommend_for_preferences(prefs_by_id, top_n, versions))
+    return results
+
+def lookup_cached_results(pref_ids, top_n, versions):
+    """
+    Split `pref_ids` into ({pref_id: cached books}, ids still to be scored).
+    Ids not in the result cache are looked up in the materialized table.
+    `versions` is {pref_id: updated_at}; when the updated_at check is on,
+    ids missing from it are unknown and map to [].
+    """
+    results = {pref_id: [] for pref_id in pref_ids}
+    missing = []
+    for pref_id in pref_ids:
+        if RESULT_CACHE_CHECK_UPDATED_AT and pref_id not in versions:
+            continue
+        cached = _cached_result(pref_id, top_n, versions)
+        if cached is None:
+            missing.append(pref_id)
+        else:
+            results[pref_id] = cached
+
+    stored = materialized_results(model_slot.get(), missing, top_n, versions)
+    results.update(stored)
+    return results, [pref_id for pref_id in missing if pref_id not in stored]
+
+def materialized_results(model, pref_ids, top_n, versions):
+    """
+    Enriched results for `pref_ids` from the table written by materialize.py,
+    as {pref_id: books}, and put into the result cache. Entries are skipped
+    (left to live scoring) when they were written for another model version,
+    hold fewer than `top_n` books, or, with the updated_at check on, the
+    preference has changed since.
+    """
+    metadata = model.materialized.metadata
+    if not pref_ids or metadata is None or top_n > metadata['top_n']:
+        return {}
+    stamps = None
+    if RESULT_CACHE_CHECK_UPDATED_AT:
+        # Without an updated_at a stored entry cannot be shown to be current
+        pref_ids = [pref_id for pref_id in pref_ids if versions.get(pref_id) is not None]
+        stamps = {pref_id: preference_stamp(versions[pref_id]) for pref_id in pref_ids}
+
+    results = {}
+    with stage_seconds.time('materialized'):
+        stored = model.materialized.get_many(pref_ids, stamps)
+    for pref_id, top_indices in stored.items():
+        top_indices = top_indices[:top_n]
+        with stage_seconds.time('enrich'):
+            results[pref_id] = enrich_books(model.book_ids[top_indices], model.book_store, model.book_codes[top_indices])
+        _store_result(pref_id, top_n, versions.get(pref_id), results[pref_id], model)
+    return results
+
+def preference_stamp(updated_at):
+    """The form `updated_at` is stored in next to a materialized entry."""
+    return None if updated_at is None else str(updated_at)
+
+def recommend_for_preferences(prefs_by_id, top_n, versions):
+    """
+    Score already-fetched preferences ({pref_id: prefs}) in chunks and cache
+    the results. CPU only, no DB access, so it can run in an executor.
+    """
+    model = model_slot.get()
+    results = {}
+    pref_ids = list(prefs_by_id)
+    for start in range(0, len(pref_ids), BATCH_CHUNK_SIZE):
+        chunk = pref_ids[start:start + BATCH_CHUNK_SIZE]
+        with stage_seconds.time('encode'):
+            user_rows = model.preference_encoder.encode_many([prefs_by_id[pref_id] for pref_id in chunk])
+        with stage_seconds.time('score'):
+            scores = model.scorer.scores(user_rows)
+        for row, pref_id in enumerate(chunk):
+            with stage_seconds.time('top_n'):
+                top_indices = top_n_indices(scores[row], top_n)
+            with stage_seconds.time('enrich'):
+                results[pref_id] = enrich_books(model.book_ids[top_indices], model.book_store, model.book_codes[top_indices])
+            _store_result(pref_id, top_n, versions.get(pref_id), results[pref_id], model)
+    return results
+
+def invalidate_recommendations(pref_id):
+    """Drop every cached and materialized result for `pref_id`; call this whenever preferences are saved."""
+    cached = result_cache.pop(str(pref_id)) is not None
+    stored = model_slot.get().materialized.delete(str(pref_id))
+    return cached or stored
+
+def _cached_result(pref_id, top_n, versions):
+    entry = result_cache.get(pref_id)
+    if entry is None:
+        return None
+    updated_at, by_top_n = entry
+    if RESULT_CACHE_CHECK_UPDATED_AT and (updated_at is None or versions.get(pref_id) != updated_at):
+        return None
+    books = by_top_n.get(top_n)
+    return None if books is None else [dict(book) for book in books]
+
+def _store_result(pref_id, top_n, updated_at, books, model):
+    # Without a timestamp a changed preference could not be detected, so don't cache it
+    if RESULT_CACHE_CHECK_UPDATED_AT and updated_at is None:
+        return
+    # A request that started before a model swap must not repopulate the cache
+    if model is not model_slot.get():
+        return
+    entry = result_cache.get(pref_id)
+    by_top_n = dict(entry[1]) if entry is not None and entry[0] == updated_at else {}
+    by_top_n[top_n] = [dict(book) for book in books]
+    result_cache.set(pref_id, (updated_at, by_top_n))
+
+def enrich_books(top_book_ids, book_store, codes=None):
+    # `codes` are the books' catalog codes when the caller already has them
+    top_book_ids = [str(book_id).strip() for book_id in top_book_ids]
+    if codes is None:
+        codes = book_store.ids.codes(top_book_ids)
     recommended_books = []
-    for book_id in top_book_ids:
-        book_id = str(book_id).strip()
-        book_row = books_df_full[books_df_full['id'] == book_id]
-        if not book_row.empty:
-            book = book_row.iloc[0]
+    for book_id, code in zip(top_book_ids, codes.tolist()):
+        book = book_store.row(code, columns=['book_title', 'author', 'genre']) if code >= 0 else None
+        if book is not None:
             recommended_books.append({
                 "book_id": book_id,
                 "book_title": book.get("book_title", "Unknown Title"),
@@ -319,38 +237,43 @@ def get_recommendations_for_user(pref_id, top_n=5):
                 "author": "-",
                 "genre": "-"
             })
-
-    print(f"[LOG] Final Recommendations: {recommended_books}\n")
     return recommended_books
 
 def get_user_preferences_from_db(pref_id):
-    pref = Preference.query.filter_by(id=pref_id).first()
-    if not pref:
+    row = db.session.execute(preference_by_id, {'pref_id': pref_id}).first()
+    if row is None:
         return None
-    # Convert SQLAlchemy object to dict, parsing arrays if needed
-    def parse_array(val):
-        if isinstance(val, list):
-            return val
-        if isinstance(val, str):
-            return [x.strip().strip('"').strip("'") for x in val.strip('{}[]').split(',') if x.strip()]
-        return []
+    return preference_to_dict(row)
+
+def get_preference_versions_from_db(pref_ids):
+    """Fetch only `updated_at` for several preferences, as {pref_id: updated_at}."""
+    if not pref_ids:
+        return {}
+    rows = db.session.execute(preference_versions_by_ids, {'pref_ids': list(pref_ids)})
+    return {str(pref_id): updated_at for pref_id, updated_at in rows}
+
+def get_many_user_preferences_from_db(pref_ids):
+    """Fetch several preferences with a single query, as {pref_id: prefs}."""
+    if not pref_ids:
+        return {}
+    rows = db.session.execute(preferences_by_ids, {'pref_ids': list(pref_ids)})
+    return {str(row.id): preference_to_dict(row) for row in rows}
+
+def parse_array(val):
+    if isinstance(val, list):
+        return val
+    if isinstance(val, str):
+        return [x.strip().strip('"').strip("'") for x in val.strip('{}[]').split(',') if x.strip()]
+    return []
+
+def preference_to_dict(pref):
+    # Convert a SQLAlchemy row (or object) to the fields PreferenceEncoder reads, parsing arrays if needed
     return {
         'id': str(pref.id),
-        'age_group': pref.age_group,
-        'education_level': pref.education_level,
-        'city': pref.city,
         'preferred_language': pref.preferred_language,
-        'reading_frequency': pref.reading_frequency,
-        'reading_time_availability': pref.reading_time_availability,
-        'reader_type': pref.reader_type,
-        'reading_habits': pref.reading_habits,
         'favorite_genres': parse_array(pref.favorite_genres),
         'preferred_book_types': parse_array(pref.preferred_book_types),
         'preferred_formats': parse_array(pref.preferred_formats),
-        'desired_feelings': parse_array(pref.desired_feelings),
-        'disliked_genres': parse_array(pref.disliked_genres),
-        # add other fields as needed
     }
 
-user_df['id'] = user_df['id'].astype(str)
 
@@ -0,0 +1,178 @@
+import os
+
+import numpy as np
+
+# Scoring engine for the recommender and the evaluation: 'dense' multiplies
+# L2-normalized float rows, 'packed' scores bit-packed 0/1 rows with popcounts
+SCORING_ENGINES = ('dense', 'packed')
+SCORING_ENGINE = os.getenv('SCORING_ENGINE', 'dense')
+PACKED_BLOCK_WORDS = 1 << 20  # uint64 words per user-block AND; bounds the temporary to 8 MB
+
+if hasattr(np, 'bitwise_count'):
+    popcount = np.bitwise_count
+else:  # NumPy < 2.0: count set bits per byte with a lookup table
+    _BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(words):
+        words = np.ascontiguousarray(words)
+        return _BYTE_COUNTS[words.view(np.uint8)].reshape(words.shape + (-1,)).sum(axis=-1, dtype=np.uint8)
+
+
+def normalize_rows(matrix, dtype=np.float32):
+    """
+    L2-normalize each row into a C-contiguous array of `dtype`, so cosine
+    similarity becomes a plain dot product. All-zero rows stay zero, as in
+    sklearn's cosine_similarity.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms[:, None], dtype=dtype)
+
+
+def top_n_indices(scores, n):
+    """
+    Indices of the `n` highest scores, best first, using argpartition instead
+    of a full argsort. Ties are broken towards the higher index, the same
+    order a stable argsort()[::-1] would give.
+    """
+    size = scores.shape[-1]
+    n = min(n, size)
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if n < size:
+        kth = scores[np.argpartition(-scores, n - 1)[:n]].min()
+        above = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)
+        candidates = np.concatenate([above, tied[::-1][:n - len(above)]])
+    else:
+        candidates = np.arange(size)
+
+    order = np.lexsort((-candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def top_n_indices_rows(scores, n):
+    """
+    Row-wise `top_n_indices` for a 2-D score matrix, with the same tie-break
+    (higher index first), using one argpartition over the whole matrix.
+    """
+    rows, size = scores.shape
+    n = min(n, size)
+    if n <= 0:
+        return np.empty((rows, 0), dtype=np.intp)
+
+    if n < size:
+        part = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        kth = np.take_along_axis(scores, part, axis=1).min(axis=1, keepdims=True)
+        above = scores > kth
+        need = n - np.count_nonzero(above, axis=1)
+        # Of the entries tied at the cut-off, keep the `need` right-most ones
+        tied_rows, tied_cols = np.nonzero(scores == kth)
+        from_right = np.cumsum(np.bincount(tied_rows, minlength=rows))[tied_rows] - np.arange(len(tied_rows))
+        keep = from_right <= need[tied_rows]
+        above_rows, above_cols = np.nonzero(above)
+        order = np.argsort(np.concatenate([above_rows, tied_rows[keep]]), kind='stable')
+        candidates = np.concatenate([above_cols, tied_cols[keep]])[order].reshape(rows, n)
+    else:
+        candidates = np.broadcast_to(np.arange(size), (rows, size))
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((-candidates, -candidate_scores), axis=-1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def pack_rows(matrix):
+    """
+    Bit-pack the nonzero pattern of each row into uint64 words: column j is
+    bit j % 64 of word j // 64, the same layout as metrics.label_bits.
+    """
+    matrix = np.asarray(matrix) != 0
+    rows, width = matrix.shape
+    padded = np.zeros((rows, max(1, -(-width // 64)) * 64), dtype=bool)
+    padded[:, :width] = matrix
+    return np.packbits(padded, axis=1, bitorder='little').view('<u8')
+
+
+class DenseCosine:
+    """
+    Cosine similarity against an L2-normalized float book matrix: user rows
+    are normalized and multiplied with it. The default engine.
+    """
+
+    def __init__(self, book_matrix):
+        self.book_matrix = book_matrix
+        self.dtype = book_matrix.dtype
+
+    def __len__(self):
+        return self.book_matrix.shape[0]
+
+    def score(self, vector):
+        """Scores of every book for one raw user row."""
+        return self.book_matrix @ normalize_rows(vector[None, :], dtype=self.dtype)[0]
+
+    def scores(self, matrix):
+        """(users, books) scores for raw user rows."""
+        return normalize_rows(matrix, dtype=self.dtype) @ self.book_matrix.T
+
+
+class PackedCosine:
+    """
+    Cosine similarity for 0/1 feature rows, on bit-packed rows:
+    popcount(a & b) / sqrt(popcount(a) * popcount(b)). Every feature is a
+    get_dummies / MultiLabelBinarizer indicator, so this is the same cosine
+    as the float product. Equal cosines come out bit-identical, so ties keep
+    the top_n_indices order. All-zero rows score 0, as in sklearn.
+
+    Books (and users in a batch) share few distinct feature patterns, so each
+    distinct pattern is packed into uint64 words and scored once, and the
+    per-book scores are a gather from that table, as in
+    metrics.relevant_counts. A book costs one int32 pattern index instead of
+    a float row.
+    """
+
+    def __init__(self, book_vectors, dtype=np.float32):
+        patterns, inverse = np.unique(pack_rows(book_vectors), axis=0, return_inverse=True)
+        self.patterns = patterns
+        self.pattern_counts = popcount(patterns).sum(axis=1, dtype=np.int64)
+        self.pattern_of = inverse.ravel().astype(np.int32)  # Book row -> index into patterns
+        self.dtype = np.dtype(dtype)
+
+    def __len__(self):
+        return len(self.pattern_of)
+
+    def score(self, vector):
+        """Scores of every book for one raw 0/1 user row."""
+        return self._pattern_scores(pack_rows(vector[None, :]))[0].take(self.pattern_of)
+
+    def scores(self, matrix):
+        """(users, books) scores for raw 0/1 user rows."""
+        user_patterns, user_inverse = np.unique(pack_rows(matrix), axis=0, return_inverse=True)
+        table = self._pattern_scores(user_patterns)
+        return table[user_inverse.ravel()].take(self.pattern_of, axis=1)
+
+    def _pattern_scores(self, bits):
+        # (user patterns, book patterns) cosine, with the AND temporary bounded to PACKED_BLOCK_WORDS
+        counts = popcount(bits).sum(axis=1, dtype=np.int64)
+        out = np.zeros((bits.shape[0], len(self.patterns)), dtype=self.dtype)
+        block = max(1, PACKED_BLOCK_WORDS // max(1, self.patterns.size))
+        for start in range(0, bits.shape[0], block):
+            stop = min(start + block, bits.shape[0])
+            shared = popcount(bits[start:stop, None, :] & self.patterns[None, :, :]).sum(axis=2, dtype=np.int64)
+            norms = np.sqrt((counts[start:stop, None] * self.pattern_counts[None, :]).astype(np.float64))
+            np.divide(shared, norms, out=out[start:stop], where=norms > 0, casting='unsafe')
+        return out
+
+
+def make_scorer(engine, book_vectors, book_matrix=None, dtype=np.float32):
+    """
+    Book-side scorer for `engine` (see SCORING_ENGINES). `book_vectors` are
+    the raw 0/1 book rows; `book_matrix`, their L2-normalized form, is
+    reused by the dense engine when given.
+    """
+    if engine == 'dense':
+        return DenseCosine(normalize_rows(book_vectors, dtype=dtype) if book_matrix is None else book_matrix)
+    if engine == 'packed':
+        return PackedCosine(book_vectors, dtype=dtype)
+    raise ValueError(f"Unknown scoring engine {engine!r}; expected one of {SCORING_ENGINES}")
@@ -0,0 +1,9 @@
+import os
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Service modules are imported top-level (as with `python app.py`), and the
+# data/ and artifacts/ paths are relative to the service directory
+sys.path.insert(0, SERVICE_DIR)
+os.chdir(SERVICE_DIR)
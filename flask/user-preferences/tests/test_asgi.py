@@ -0,0 +1,95 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+import asgi
+import recommendation
+
+PREFERENCES_TABLE = """
+CREATE TABLE preferences (
+    id TEXT PRIMARY KEY, updated_at TIMESTAMP, age_group TEXT, education_level TEXT, city TEXT,
+    preferred_language TEXT, reading_frequency TEXT, reading_time_availability TEXT, reader_type TEXT,
+    reading_habits TEXT, favorite_genres TEXT, preferred_book_types TEXT, preferred_formats TEXT,
+    desired_feelings TEXT, disliked_genres TEXT
+)
+"""
+PREFERENCES = [
+    ('p1', '2024-01-01 00:00:00', '18-24', 'S1', 'Jakarta', 'Indonesian', 'Daily', '1-2 hours', 'Casual',
+     'Evening', '{Fiction,Romance}', '{Novel}', '{Paperback}', '{}', '{}'),
+    ('p2', '2024-01-02 00:00:00', '25-34', 'S2', 'Bandung', 'English', 'Weekly', '< 1 hour', 'Avid',
+     'Morning', '{Mystery}', '{Comic}', '{Ebook}', '{}', '{}'),
+]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = tmp_path / 'preferences.db'
+    with sqlite3.connect(path) as conn:
+        conn.execute(PREFERENCES_TABLE)
+        conn.executemany(f"INSERT INTO preferences VALUES ({','.join('?' * 15)})", PREFERENCES)
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{path}')
+    recommendation.result_cache.clear()
+    yield path
+    recommendation.result_cache.clear()
+
+
+def test_asgi_app_serves_recommendations_off_the_event_loop(database, monkeypatch):
+    lookup_threads = []
+    lookup_cached_results = asgi.lookup_cached_results
+
+    def recording_lookup(*args):
+        lookup_threads.append(threading.current_thread())
+        return lookup_cached_results(*args)
+
+    monkeypatch.setattr(asgi, 'lookup_cached_results', recording_lookup)
+
+    async def run():
+        async with asgi.app.test_app() as test_app:
+            client = test_app.test_client()
+            single = await client.get('/user-preferences/recommendation', query_string={'id': 'p1', 'top_n': 3})
+            cached = await client.get('/user-preferences/recommendation', query_string={'id': 'p1', 'top_n': 3})
+            batch = await client.post('/user-preferences/recommendation/batch', json={'ids': ['p1', 'p2', 'zz'], 'top_n': 3})
+            invalidated = await client.post('/user-preferences/recommendation/invalidate', json={'id': 'p1'})
+            return (
+                (single.status_code, await single.get_json()),
+                (cached.status_code, await cached.get_json()),
+                (batch.status_code, await batch.get_json()),
+                (invalidated.status_code, await invalidated.get_json()),
+            )
+
+    event_loop_thread = threading.current_thread()
+    single, cached, batch, invalidated = asyncio.run(run())
+
+    assert single[0] == 200 and len(single[1]['recommendations']) == 3
+    assert cached == single
+    assert batch[0] == 200
+    assert batch[1]['recommendations']['p1'] == single[1]['recommendations']
+    assert len(batch[1]['recommendations']['p2']) == 3
+    assert batch[1]['recommendations']['zz'] == []
+    assert invalidated == (200, {'id': 'p1', 'invalidated': True})
+
+    assert len(lookup_threads) == 3
+    assert all(thread is not event_loop_thread for thread in lookup_threads)
+
+
+def test_asgi_app_rejects_invalid_top_n_and_oversized_batches(database):
+    async def run():
+        async with asgi.app.test_app() as test_app:
+            client = test_app.test_client()
+            responses = [
+                await client.get('/user-preferences/recommendation', query_string={'id': 'p1', 'top_n': top_n})
+                for top_n in ('-3', '0', 'abc', '2.5')
+            ]
+            responses += [
+                await client.post('/user-preferences/recommendation/batch', json={'ids': ['p1'], 'top_n': top_n})
+                for top_n in (-1, 'abc', True)
+            ]
+            responses.append(await client.post(
+                '/user-preferences/recommendation/batch', json={'ids': [f'p{i}' for i in range(asgi.MAX_BATCH_IDS + 1)]}
+            ))
+            return [(response.status_code, await response.get_json()) for response in responses]
+
+    for status, body in asyncio.run(run()):
+        assert status == 400 and 'error' in body
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from model import RecommenderModel, build_model
+from scoring import PackedCosine
+
+
+@pytest.fixture(scope='module')
+def parts():
+    return build_model()
+
+
+def test_packed_model_keeps_no_dense_book_matrices(parts):
+    dense = RecommenderModel(parts, scoring_engine='dense')
+    packed = RecommenderModel(parts, scoring_engine='packed')
+
+    assert isinstance(packed.scorer, PackedCosine)
+    assert not [value for value in vars(packed).values() if isinstance(value, np.ndarray) and value.dtype.kind == 'f']
+    assert list(packed.feature_columns) == list(parts['books_vector'].columns)
+
+    user_rows = parts['books_vector'].to_numpy()[:20]
+    np.testing.assert_allclose(packed.scorer.scores(user_rows), dense.scorer.scores(user_rows), atol=1e-6)